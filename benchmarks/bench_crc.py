@@ -0,0 +1,52 @@
+"""
+Throughput of the table driven CRC-8/Maxim in hanazeder.comm compared with
+crccheck (only needed for this benchmark, install it with pip).
+
+Run from the repository root:
+    python -m benchmarks.bench_crc
+"""
+import time
+
+from hanazeder.comm import crc8_maxim
+
+try:
+    from crccheck.crc import Crc8Maxim as CrccheckCrc8Maxim
+except ImportError:
+    CrccheckCrc8Maxim = None
+
+
+def bench(name, func, data, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{name:<32} {len(data) / best / 1e6:8.2f} MB/s  (crc {result:02X})')
+    return best
+
+
+def per_message(calc):
+    """Checksum every 8 byte slice separately like the encoder does."""
+    def run(data):
+        result = 0
+        view = memoryview(data)
+        for pos in range(0, len(data), 8):
+            result = calc(view[pos:pos + 8])
+        return result
+    return run
+
+
+def main():
+    data = bytes(range(256)) * 256
+    bench('hanazeder crc8_maxim', crc8_maxim, data)
+    bench('hanazeder crc8_maxim 8 byte msgs', per_message(crc8_maxim), data)
+    if CrccheckCrc8Maxim is None:
+        print('crccheck not installed, skipping comparison')
+        return
+    bench('crccheck Crc8Maxim', CrccheckCrc8Maxim.calc, data)
+    bench('crccheck Crc8Maxim 8 byte msgs', per_message(CrccheckCrc8Maxim.calc), data)
+
+
+if __name__ == '__main__':
+    main()
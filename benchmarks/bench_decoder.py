@@ -0,0 +1,56 @@
+"""
+Compare the per-byte HanazederReader with the chunk oriented
+HanazederFrameDecoder on synthetic traffic.
+
+Run from the repository root:
+    python -m benchmarks.bench_decoder
+"""
+import time
+
+from hanazeder.comm import HanazederFrameDecoder, HanazederReader
+
+from .traffic import HEADER, traffic_stream, split_chunks
+
+
+def run_reader(chunks) -> int:
+    reader = HanazederReader(None, HEADER, False)
+    count = 0
+    for chunk in chunks:
+        for byte in chunk:
+            if reader.read(byte):
+                count += 1
+    return count
+
+
+def run_decoder(chunks) -> int:
+    decoder = HanazederFrameDecoder(HEADER)
+    count = 0
+    for chunk in chunks:
+        count += len(decoder.feed(chunk))
+    return count
+
+
+def bench(name, func, chunks, total_bytes, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        packets = func(chunks)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{name:<24} {packets:>7} packets  {best * 1000:8.1f} ms  '
+          f'{total_bytes / best / 1e6:6.2f} MB/s  {best / packets * 1e6:6.2f} us/packet')
+    return best
+
+
+def main():
+    data = traffic_stream(500)
+    for (min_size, max_size) in ((1, 8), (1, 64), (256, 1024)):
+        chunks = split_chunks(data, min_size, max_size)
+        print(f'{len(data)} bytes in {len(chunks)} chunks of {min_size}-{max_size} bytes')
+        reader = bench('HanazederReader', run_reader, chunks, len(data))
+        decoder = bench('HanazederFrameDecoder', run_decoder, chunks, len(data))
+        print(f'speedup {reader / decoder:.1f}x\n')
+
+
+if __name__ == '__main__':
+    main()
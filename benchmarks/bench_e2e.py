@@ -0,0 +1,95 @@
+"""
+End to end benchmark of HanazederFP against the simulated controller for the
+typical workloads: a sweep of all 15 sensors and a loop reading energy and
+outlets. Reports requests per second, p50/p99 round trip latency from the
+metrics and the CPU time the client spends per sample.
+
+The simulator runs in a child process so its CPU time is not counted. The
+latency of the simulator is zero and its line unlimited, which makes the
+numbers mostly depend on the client and the loopback socket. Pass --pty to
+go through a pty and the serial transport instead of TCP.
+
+Run from the repository root:
+    python -m benchmarks.bench_e2e [--pty]
+"""
+import asyncio
+import logging
+import multiprocessing
+import sys
+import time
+
+from hanazeder.Hanazeder import HanazederFP
+from hanazeder.metrics import HanazederMetrics, Histogram
+from hanazeder.simulator import FPSimulator
+
+ROUNDS = 200
+# Fine buckets, the simulator answers well below a millisecond
+BUCKETS = tuple(x / 100000 for x in range(5, 100, 5)) + (0.001, 0.002, 0.005, 0.01, 0.05, 0.1)
+
+
+def serve(use_pty: bool, address, stop):
+    async def run():
+        simulator = FPSimulator(latency=0, baudrate=None, rx_queue=64)
+        if use_pty:
+            address.put(simulator.start_pty())
+        else:
+            address.put(await simulator.start())
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        await simulator.close()
+    asyncio.run(run())
+
+
+async def sensor_sweep(conn: HanazederFP):
+    await conn.read_sensors(range(15))
+    return 15
+
+
+async def energy_outlets(conn: HanazederFP):
+    await asyncio.gather(conn.read_energy(), conn.read_outlets())
+    return 2
+
+
+async def run(name: str, workload, address):
+    conn = HanazederFP(request_timeout=0.5, max_in_flight=4)
+    if isinstance(address, str):
+        await conn.open(serial_port=address)
+    else:
+        await conn.open(serial_port=None, address=address[0], port=address[1])
+    # Warm up the RTT estimate and templates
+    await workload(conn)
+    metrics = conn.metrics = HanazederMetrics(BUCKETS)
+    samples = 0
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        samples += await workload(conn)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    conn.shutdown()
+    conn.connection.close()
+    latency = Histogram(BUCKETS)
+    for histogram in metrics.latency.values():
+        latency.merge(histogram)
+    print(f'{name:<16} {samples / elapsed:8.0f} req/s  p50 {latency.percentile(50) * 1e6:6.0f} us  '
+          f'p99 {latency.percentile(99) * 1e6:6.0f} us  {cpu / samples * 1e6:6.1f} us CPU/sample  '
+          f'{metrics.retransmits} resent')
+
+
+async def main(address):
+    logging.getLogger('hanazeder').setLevel(logging.ERROR)
+    await run('sensor sweep', sensor_sweep, address)
+    await run('energy+outlets', energy_outlets, address)
+
+
+if __name__ == '__main__':
+    use_pty = '--pty' in sys.argv[1:]
+    address = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(use_pty, address, stop))
+    server.start()
+    try:
+        asyncio.run(main(address.get(timeout=10)))
+    finally:
+        stop.set()
+        server.join()
@@ -0,0 +1,45 @@
+"""
+Cost of building request frames with hanazeder_encode_msg compared with
+patching the message number into a HanazederMsgTemplate.
+
+Run from the repository root:
+    python -m benchmarks.bench_encode
+"""
+import time
+
+from hanazeder.comm import HanazederMsgTemplate, hanazeder_encode_msg
+
+HEADER = b'\xEE'
+REQUESTS = [b'\x04\x01' + idx.to_bytes(1, byteorder='little') for idx in range(15)]
+ROUNDS = 2000
+
+
+def bench(name, func):
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    print(f'{name:<24} {count / elapsed / 1e3:8.1f} k frames/s')
+
+
+def encode_msg():
+    msg_no = 0
+    for _ in range(ROUNDS):
+        for request in REQUESTS:
+            hanazeder_encode_msg(HEADER, msg_no, request)
+            msg_no = (msg_no + 1) % 238
+    return ROUNDS * len(REQUESTS)
+
+
+def encode_template():
+    templates = [HanazederMsgTemplate(HEADER, request) for request in REQUESTS]
+    msg_no = 0
+    for _ in range(ROUNDS):
+        for template in templates:
+            template.encode(msg_no)
+            msg_no = (msg_no + 1) % 238
+    return ROUNDS * len(REQUESTS)
+
+
+if __name__ == '__main__':
+    bench('hanazeder_encode_msg', encode_msg)
+    bench('HanazederMsgTemplate', encode_template)
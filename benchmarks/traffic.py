@@ -0,0 +1,60 @@
+"""
+Synthetic reply traffic of an FP10 used by the benchmarks. One polling round
+consists of the information handshake, the sensor label config block, all
+15 sensors, the energy and the outlet debug blocks. Only the two frames of
+the test vectors are real replies, the round payloads are made up with the
+sizes of the real ones.
+"""
+import random
+from typing import List
+
+from hanazeder.comm import hanazeder_encode_reply
+from hanazeder.encoding import hex_to_byte
+
+HEADER = b'\xEE'
+
+# Real replies from the test vectors (msg_no, type, size, payload, checksum)
+CAPTURED_REPLIES = [
+    hex_to_byte('EE 00 F0 05 00 00 02 01 06 F9'),
+    hex_to_byte('EE 03 F0 02 55 01 A6'),
+]
+
+# Made up reply payloads of one polling round, framed with fresh message
+# numbers
+ROUND_PAYLOADS = [
+    hex_to_byte('00 00 02 01 06'),
+    bytes(range(60)),
+] + [
+    (value * 7 + 150).to_bytes(2, byteorder='little') for value in range(15)
+] + [
+    hex_to_byte('FF 7F'),
+    hex_to_byte('3A 11 EE 00 05 00 00 00'),
+    hex_to_byte('01 00 00 01 00 00 00 00 00 00'),
+]
+
+
+def traffic_stream(rounds: int) -> bytes:
+    """Replies of rounds polling rounds, including ones with escaped checksums."""
+    frames = bytearray()
+    msg_no = 0
+    for _ in range(rounds):
+        for frame in CAPTURED_REPLIES:
+            frames += frame
+        for payload in ROUND_PAYLOADS:
+            frames += hanazeder_encode_reply(HEADER, msg_no, payload)
+            msg_no = (msg_no + 1) % 256
+            if msg_no == HEADER[0]:
+                msg_no += 1
+    return bytes(frames)
+
+
+def split_chunks(data: bytes, min_size=1, max_size=64, seed=1) -> List[bytes]:
+    """Split data into chunks of varying size like a serial transport does."""
+    rng = random.Random(seed)
+    chunks = []
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(min_size, max_size)
+        chunks.append(data[pos:pos + size])
+        pos += size
+    return chunks
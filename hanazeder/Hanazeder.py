@@ -1,14 +1,23 @@
 from ast import Call
 import asyncio
 import serial_asyncio
+import struct
 import time
 from enum import IntEnum
-from typing import Any, Callable, List, Tuple
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 import logging
 import serial
 
 from .types import SerialOrNetwork, EnergyReading
-from .comm import HanazederPacket, HanazederReader, hanazeder_encode_msg, hanazeder_decode_num
+from .cache import MISSING, TTLCache
+from .rtt import RttEstimator
+from .backoff import Backoff
+from .metrics import HanazederMetrics
+from .stream import BLOCK, SnapshotStream
+from .config import ENTRY_SIZE, MAX_CONFIG_ENTRIES, ConfigTable
+from .shadow import DebugShadow
+from .comm import HanazederPacket, HanazederFrameDecoder, HanazederMsgTemplate, IllegalArgumentException, hanazeder_decode_num, hanazeder_decode_raw
 from .encoding import dec_to_bytes, byte_to_hex
 
 logger = logging.getLogger('hanazeder')
@@ -27,6 +36,9 @@ class RequestTimeoutError(Exception):
 
 class ShutdownError(Exception):
     pass
+
+class InvalidReplyError(Exception):
+    pass
 class DeviceType(IntEnum):
     FP10 = 0
     FP6 = 1
@@ -136,15 +148,24 @@ SENSOR_LABELS = [
 ]
 
 DecoderCB = Callable[[HanazederPacket], Any]
+
+# Bytes buffered by a serial transport before writes are paused
+SERIAL_WRITE_HIGH_WATER = 256
+
+# Debug memory (start, count) of the energy reading and the outlet states
+ENERGY_RANGE = (313, 8)
+OUTLETS_RANGE = (211, 10)
+# Bytes of total, current and impulse at the start of ENERGY_RANGE
+ENERGY_SIZE = struct.calcsize('<Hhh')
 class ConfigEntry:
-    key = 0
+    __slots__ = ('key', 'value', 'max_value', 'min_value', 'change_step')
 
-    def __init__(self, key, data: bytes):
+    def __init__(self, key, data: bytes, offset=0):
         self.key = key
-        self.value = data[0]
-        self.max_value = data[1]
-        self.min_value = data[2]
-        self.change_step = data[3]
+        self.value = data[offset]
+        self.max_value = data[offset + 1]
+        self.min_value = data[offset + 2]
+        self.change_step = data[offset + 3]
 
 class HanazederRequestState(IntEnum):
     UNSENT = 0
@@ -154,64 +175,119 @@ class HanazederRequestState(IntEnum):
     SHUTDOWN = 4
     DISCONNECTED = 5
 class HanazederRequest:
-    result = None
-    def __init__(self, msg_no: int, type: int, decoder: DecoderCB, msg: bytes):
+    __slots__ = ('msg_no', 'type', 'decoder', 'created', 'future', 'msg', 'state',
+        'sent', 'retries', 'timer', 'result')
+
+    def __init__(self, msg_no: int, type: int, decoder: DecoderCB, msg: bytes, future: asyncio.Future):
+        self.result = None
         self.msg_no = msg_no
         self.type = type
         self.decoder = decoder
         self.created = time.monotonic()
-        self.event = asyncio.Event()
+        # Completed with the response packet or the error
+        self.future = future
         self.msg = msg
         self.state = HanazederRequestState.UNSENT
+        self.sent = None
+        self.retries = 0
+        # Deadline timer of the current attempt
+        self.timer = None
 
 class FPProtocol(asyncio.Protocol):
     device = None
+    # High and low water mark of the transport, None for its defaults
+    write_limits = (None, None)
     def connection_made(self, transport):
         self.connection = transport
         if hasattr(self.connection, 'serial'):
-            transport.serial.rts = True
+            # Raised once, with rtscts the driver keeps it up to date
+            try:
+                transport.serial.rts = True
+            except OSError:
+                # Ports without modem lines like ptys
+                pass
+            # Get pause_writing once requests queue up in front of the line
+            self.write_limits = (SERIAL_WRITE_HIGH_WATER, SERIAL_WRITE_HIGH_WATER // 4)
+            transport.set_write_buffer_limits(*self.write_limits)
 
     def data_received(self, data):
         if self.device.debug:
             logger.debug('Data received: %s', data)
         self.device.read_bytes(data)
-        logger.debug('Done with read_bytes')
-        if hasattr(self.connection, 'serial'):
-            self.connection.resume_reading()
-            self.connection.serial.rts = True
-        #asyncio.get_event_loop().create_task(self.device.read_bytes(data))
 
     def connection_lost(self, exc):
-        logger.warn('The server closed the connection')
-        self.device.connected = False
-        # Awake all listeners
-        for request in self.device.queue:
-            request.state = HanazederRequestState.DISCONNECTED
-            request.event.set()
+        if self.device.running:
+            logger.warning('The server closed the connection')
+        # Ignore transports replaced by a reconnect
+        if self.device.connection is self.connection:
+            self.device.connection_lost(exc)
 
     def pause_writing(self):
-        print('pause writing')
-        print(self.transport.get_write_buffer_size())
+        logger.debug('Pause writing, %d bytes buffered', self.connection.get_write_buffer_size())
+        self.device.writable.clear()
 
     def resume_writing(self):
-        print(self.transport.get_write_buffer_size())
-        print('resume writing')
+        logger.debug('Resume writing, %d bytes buffered', self.connection.get_write_buffer_size())
+        self.device.writable.set()
 
 class HanazederFP:
     HEADER = b'\xEE'
-    last_msg_num = 0
-    connected = True
-    debug = False
+    # Message numbers are a single byte, minus the header used for escaping
+    MSG_NO_COUNT = 255
+    # Number of request templates kept, see template()
+    MAX_TEMPLATES = 256
     connection: SerialOrNetwork
-    queue: List[HanazederRequest] = []
-    running = True
 
-    def __init__(self, debug=False, request_timeout=2):
+    def __init__(self, debug=False, request_timeout=2, max_in_flight=4, cache: Optional[TTLCache] = None,
+            max_retries=3, metrics: Optional[HanazederMetrics] = None, reconnect: Optional[Backoff] = None,
+            max_pending=64):
+        # All state is per instance so many connections can share a process
+        self.connected = True
+        self.running = True
+        # Reconnect with these delays when the connection is lost, requests
+        # are kept meanwhile, up to max_pending new ones. None fails them.
+        self.reconnect = reconnect
+        self.max_pending = max_pending
+        self.reconnect_task = None
+        self.identity_check = None
+        self.disconnected_at = None
+        # Cleared while reconnecting
+        self.online = asyncio.Event()
+        self.online.set()
+        self.offline_waiters = 0
         self.debug = debug
+        # Optional counters and latency histograms, None records nothing
+        self.metrics = metrics
         self.loop = asyncio.get_running_loop()
-        self.queue_lock = asyncio.Lock()
-        self.msg_no_lock = asyncio.Lock()
+        # Timeout until the round trip time has been measured
         self.request_timeout = request_timeout
+        self.rtt = RttEstimator(initial_rto=request_timeout,
+            min_rto=min(0.05, request_timeout), max_rto=max(10, request_timeout))
+        self.max_retries = max_retries
+        # Window of requests sent but not answered yet
+        self.max_in_flight = max_in_flight
+        self.window = asyncio.Semaphore(max_in_flight)
+        # Cleared while the transport asks us to stop writing
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.last_msg_num = 0
+        # Requests waiting for their response by message number, None marks
+        # numbers handed out by get_next_msg_no but not sent yet
+        self.in_flight: Dict[int, Optional[HanazederRequest]] = {}
+        self.msg_no_slots = asyncio.Semaphore(self.MSG_NO_COUNT)
+        self.reader = HanazederFrameDecoder(self.HEADER, self.debug)
+        # Requests on the wire by request bytes, shared by concurrent readers
+        self.pending_reads: Dict[bytes, asyncio.Task] = {}
+        self.read_waiters: Dict[bytes, int] = {}
+        # Optional cache for metadata that rarely changes
+        self.cache = cache
+        self.templates: Dict[bytes, HanazederMsgTemplate] = {}
+        # Frames sent in the current loop iteration, written together
+        self.write_buffer: List[bytes] = []
+        # Registered debug memory ranges, read together
+        self.shadow = DebugShadow(self)
+        # Background check of a stored device profile, set by load_profile
+        self.profile_check: Optional[asyncio.Task] = None
     
     async def open(self,
             serial_port="/dev/ttyUSB0",
@@ -223,110 +299,391 @@ class HanazederFP:
                 self.loop, FPProtocol, serial_port, baudrate=38400, timeout = timeout,
                 rtscts = True, bytesize=serial.EIGHTBITS, stopbits = serial.STOPBITS_ONE, parity=serial.PARITY_NONE 
             )
+            self.target = f'serial:{serial_port}'
+            # The serial transport calls connection_made soon, let it set
+            # up the port before anything is written
+            await asyncio.sleep(0)
         elif address and port:
             (self.connection, proto) = await self.loop.create_connection(FPProtocol, address, port)
+            self.target = f'tcp:{address}:{port}'
         else:
             raise ConnectionInvalidError("Specify either address and port or serial port")
         proto.device = self
-        self.reader = HanazederReader(self.connection, self.HEADER, self.debug)
-        # Check queue for stuck messages periodically
-        self.queue_check_task = self.loop.create_task(self.check_queue(), name="check_queue")
+        # Restored by drain(), serial transports cannot report them
+        self.write_limits = proto.write_limits
+        self.open_args = (serial_port, address, port, timeout)
+        self.connected = True
+        # A transport lost while paused never resumes writing
+        self.writable.set()
+        self.online.set()
+
+    def connection_lost(self, exc):
+        self.connected = False
+        # Nothing is written anymore, let drain() return
+        self.writable.set()
+        if self.reconnect is None or not self.running:
+            # Awake all listeners
+            self.fail_requests(HanazederRequestState.DISCONNECTED, NotConnectedError)
+            return
+        logger.warning('Connection to %s lost, reconnecting', self.target)
+        self.online.clear()
+        self.disconnected_at = time.monotonic()
+        if self.metrics is not None:
+            self.metrics.disconnects += 1
+        # Requests in flight are sent again once reconnected
+        self.write_buffer.clear()
+        for request in self.in_flight.values():
+            if request is not None and request.timer:
+                request.timer.cancel()
+                request.timer = None
+        self.reconnect_task = self.loop.create_task(self.supervise(), name='reconnect')
+
+    async def supervise(self):
+        self.reconnect.reset()
+        while self.running:
+            await asyncio.sleep(self.reconnect.next())
+            try:
+                await self.open(*self.open_args)
+                break
+            except OSError as err:
+                logger.warning('Reconnecting to %s failed: %s', self.target, err)
+        else:
+            return
+        recovery = time.monotonic() - self.disconnected_at
+        logger.warning('Reconnected to %s after %.1f s', self.target, recovery)
+        if self.metrics is not None:
+            self.metrics.reconnects += 1
+            self.metrics.recovery.record(recovery)
+        # Replay before requests waiting for the connection get their turn
+        for request in list(self.in_flight.values()):
+            if request is not None:
+                self.transmit(request)
+        if hasattr(self, 'device_type'):
+            self.identity_check = self.loop.create_task(self.verify_identity(), name='identity_check')
+
+    async def verify_identity(self):
+        """
+        Keep the device info and cached metadata if the device that came back
+        is the same one, otherwise drop everything cached about it.
+        """
+        identity = self.identity()
+        if self.cache is not None:
+            self.cache.invalidate('information')
+        try:
+            await self.read_information()
+        except Exception as err:
+            logger.warning('Checking identity of %s failed: %s', self.target, err)
+            return
+        if self.identity() != identity:
+            logger.warning('Device at %s changed, dropping cached metadata', self.target)
+            if self.cache is not None:
+                self.cache.invalidate()
+
+    def identity(self) -> Tuple:
+        return (getattr(self, 'device_type', None), getattr(self, 'hardware_platform', None),
+            getattr(self, 'version', None))
     
     
     async def get_next_msg_no(self) -> int:
-        async with self.msg_no_lock:
-            msg_no = self.last_msg_num
-            self.last_msg_num = (self.last_msg_num + 1) % 256
-            # Avoid escape byte
-            if self.last_msg_num == 238:
-                self.last_msg_num = 239
-            return msg_no
+        """
+        Reserve the next free message number. Numbers still in flight and the
+        escape byte are skipped, waits while all numbers are in use.
+        """
+        await self.msg_no_slots.acquire()
+        msg_no = self.find_free_msg_no()
+        self.in_flight[msg_no] = None
+        return msg_no
+
+    def find_free_msg_no(self) -> int:
+        msg_no = self.last_msg_num
+        while msg_no == self.HEADER[0] or msg_no in self.in_flight:
+            msg_no = (msg_no + 1) % 256
+        self.last_msg_num = (msg_no + 1) % 256
+        return msg_no
+    
+    def release_msg_no(self, msg_no: int):
+        if msg_no in self.in_flight and self.in_flight[msg_no] is None:
+            del self.in_flight[msg_no]
+            self.msg_no_slots.release()
+    
+    def release_request(self, request: HanazederRequest):
+        if request.timer:
+            request.timer.cancel()
+            request.timer = None
+        if self.in_flight.get(request.msg_no) is request:
+            del self.in_flight[request.msg_no]
+            self.msg_no_slots.release()
+            self.window.release()
     
     async def send_msg(self, msg: bytes, decoder: DecoderCB) -> HanazederRequest:
+        """
+        Send msg once the window has room and the transport accepts writes.
+        Returns the request to pass to handle_req_response.
+        """
+        request = HanazederRequest(msg[1], msg[2], decoder, msg, self.loop.create_future())
+        if not self.online.is_set():
+            await self.wait_online(request.msg_no)
+        if request.msg_no not in self.in_flight:
+            # Message number was not reserved through get_next_msg_no
+            await self.msg_no_slots.acquire()
+            self.in_flight[request.msg_no] = None
+        elif self.in_flight[request.msg_no] is not None:
+            raise IllegalArgumentException(f'Message number {request.msg_no} is already in flight')
+        try:
+            await self.window.acquire()
+        except asyncio.CancelledError:
+            self.release_msg_no(request.msg_no)
+            raise
+        try:
+            await self.writable.wait()
+        except asyncio.CancelledError:
+            self.window.release()
+            self.release_msg_no(request.msg_no)
+            raise
+        self.start_request(request)
+        return request
+
+    async def send_body(self, body: bytes, decoder: DecoderCB) -> HanazederRequest:
+        """
+        Like send_msg for a request without message number. The number is
+        only taken once the window has room, so at most max_in_flight
+        numbers are held and retransmits always find a fresh one.
+        """
+        if not self.online.is_set():
+            await self.wait_online(None)
+        await self.window.acquire()
+        try:
+            await self.writable.wait()
+            await self.msg_no_slots.acquire()
+        except asyncio.CancelledError:
+            self.window.release()
+            raise
+        msg_no = self.find_free_msg_no()
+        msg = self.template(body).encode(msg_no)
+        request = HanazederRequest(msg_no, body[0], decoder, msg, self.loop.create_future())
+        self.start_request(request)
+        return request
+
+    def start_request(self, request: HanazederRequest):
         if self.debug:
-            logger.debug('Sending msg #%d: %s', msg[1], byte_to_hex(msg))
-        request = HanazederRequest(msg[1], msg[2], decoder, msg)
-        async with self.queue_lock:
-            self.queue.append(request)
-            self.connection.write(msg)
-            if hasattr(self.connection, 'serial'):
-                self.connection.serial.flush()
-                logger.debug('flushing serial')
-            request.state = HanazederRequestState.SENT
-            return request
+            logger.debug('Sending msg #%d: %s', request.msg_no, byte_to_hex(request.msg))
+        request.created = time.monotonic()
+        self.in_flight[request.msg_no] = request
+        # Also frees the message number when the caller stops waiting
+        request.future.add_done_callback(lambda _: self.release_request(request))
+        self.transmit(request)
+        request.state = HanazederRequestState.SENT
+
+    async def wait_online(self, msg_no: int):
+        if self.reconnect is None or self.offline_waiters >= self.max_pending:
+            self.release_msg_no(msg_no)
+            raise NotConnectedError()
+        self.offline_waiters += 1
+        try:
+            await self.online.wait()
+        except asyncio.CancelledError:
+            self.release_msg_no(msg_no)
+            raise
+        finally:
+            self.offline_waiters -= 1
+
+    def template(self, request: bytes) -> HanazederMsgTemplate:
+        template = self.templates.get(request)
+        if template is None:
+            if len(self.templates) >= self.MAX_TEMPLATES:
+                self.templates.clear()
+            template = HanazederMsgTemplate(self.HEADER, request)
+            self.templates[request] = template
+        return template
+
+    def transmit(self, request: HanazederRequest):
+        if not self.write_buffer:
+            self.loop.call_soon(self.flush_writes)
+        self.write_buffer.append(request.msg)
+        request.sent = time.monotonic()
+        if self.metrics is not None and not request.retries:
+            self.metrics.requests += 1
+        if request.timer:
+            # Deadline of a frame sent before, e.g. replayed after a reconnect
+            request.timer.cancel()
+        request.timer = self.loop.call_later(
+            self.rtt.rto(request.type, request.retries), self.request_timed_out, request)
+
+    def flush_writes(self):
+        if not self.write_buffer:
+            # Dropped by a lost connection
+            return
+        data = b''.join(self.write_buffer)
+        self.write_buffer.clear()
+        # Never wait for the line here, the transport writes as the port
+        # accepts data and the request window paces us
+        self.connection.write(data)
+        if self.metrics is not None:
+            self.metrics.writes += 1
+            self.metrics.bytes_sent += len(data)
+
+    def request_timed_out(self, request: HanazederRequest):
+        request.timer = None
+        if self.in_flight.get(request.msg_no) is not request:
+            return
+        if request.retries >= self.max_retries:
+            logger.warning('Request #%d has timed out', request.msg_no)
+            request.state = HanazederRequestState.TIMEOUT
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            self.release_request(request)
+            if not request.future.done():
+                request.future.set_exception(RequestTimeoutError())
+            return
+        # Resend under a fresh number so a late reply to the previous attempt
+        # cannot be taken for the answer to this one
+        del self.in_flight[request.msg_no]
+        request.msg_no = self.find_free_msg_no()
+        self.in_flight[request.msg_no] = request
+        body = request.msg[2:-1].replace(self.HEADER + self.HEADER, self.HEADER)
+        request.msg = self.template(body).encode(request.msg_no)
+        request.retries += 1
+        if self.metrics is not None:
+            self.metrics.retransmits += 1
+        logger.warning('Request timed out, resending as #%d (retry %d)', request.msg_no, request.retries)
+        if self.debug:
+            logger.debug('Resending msg #%d: %s', request.msg_no, byte_to_hex(request.msg))
+        self.transmit(request)
     
+    async def drain(self):
+        """Wait until everything written has left the serial port."""
+        self.flush_writes()
+        if self.connection.get_write_buffer_size():
+            # With both limits at 0 the transport pauses us right away and
+            # resumes once its buffer is empty
+            self.connection.set_write_buffer_limits(high=0, low=0)
+            try:
+                await self.writable.wait()
+            finally:
+                if not self.connection.is_closing():
+                    self.connection.set_write_buffer_limits(*self.write_limits)
+        if hasattr(self.connection, 'serial'):
+            # tcdrain blocks, keep it off the event loop
+            await self.loop.run_in_executor(None, self.connection.serial.flush)
+
     def read_bytes(self, bytes):
-        logger.debug('read_bytes')
-        for byte in bytes:
-            packet = self.reader.read(byte)
-            if packet:
-                self.handle_packet(packet)
+        if self.metrics is not None:
+            self.metrics.bytes_received += len(bytes)
+        for packet in self.reader.feed(bytes):
+            self.handle_packet(packet)
     
-    async def check_queue(self):
-        while self.connected:
-            now = time.monotonic()
-            async with self.queue_lock:
-                logger.debug('queue check starting, getting lock')
-                for index, request in enumerate(self.queue):
-                    if now - request.created > self.request_timeout:
-                        logger.warn('Request #%d has timed out', request.msg_no)
-                        #request.msg_no = await self.get_next_msg_no()
-                        #request.msg = hanazeder_encode_msg(self.HEADER, request.msg_no, request.msg[2:-1])
-                        self.connection.write(request.msg)
-                        if hasattr(self.connection, 'serial'):
-                            self.connection.serial.flush()
-                            logger.debug('flushing serial')
-                        if self.debug:
-                            logger.debug('Resending msg #%d: %s', request.msg[1], byte_to_hex(request.msg))
-                        #request.state = HanazederRequestState.TIMEOUT
-                        #request.event.set()
-                        #self.queue.pop(index)
-            logger.debug('queue check done')
-            await asyncio.sleep(self.request_timeout)
-          
+    def metrics_snapshot(self) -> Optional[Dict]:
+        """Current metrics including decoder errors, None without metrics."""
+        if self.metrics is None:
+            return None
+        return self.metrics.snapshot(self.reader)
 
     def shutdown(self):
-        self.running = False       
-        for request in self.queue:
-            request.state = HanazederRequestState.SHUTDOWN
-            request.event.set()
+        self.running = False
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+        self.fail_requests(HanazederRequestState.SHUTDOWN, ShutdownError)
 
+    def fail_requests(self, state: HanazederRequestState, error: type):
+        for request in list(self.in_flight.values()):
+            if request is not None:
+                request.state = state
+                self.release_request(request)
+                if not request.future.done():
+                    request.future.set_exception(error())
 
     def handle_packet(self, packet: HanazederPacket):
         if self.debug:
-            packet_debug = ""
-            for req in self.queue:
-                packet_debug = f"{packet_debug} #{req.msg_no}"
             logger.debug('Packet read #%d type %d: %s.', packet.msg_no, packet.msg_type, packet.msg)
-            logger.debug('Queue: %s', packet_debug)
-        found = False
-        #async with self.queue_lock:
-        for index, req in enumerate(self.queue):
-            if req.msg_no == packet.msg_no:
-                req.result = req.decoder(packet)
-                found = True
-                req.state = HanazederRequestState.SUCCESSFUL
-                req.event.set()
-                self.queue.pop(index)
-                break
-        if not found:
-            logger.error(f"Couldn't find message {packet.msg_no} in queue!")
-
-    async def handle_req_response(self, req: HanazederRequest):
-        if req.state == HanazederRequestState.TIMEOUT:
-            raise RequestTimeoutError()
-        elif req.state == HanazederRequestState.SHUTDOWN:
-            raise ShutdownError()
-        elif req.state == HanazederRequestState.DISCONNECTED:
-            raise NotConnectedError()
+            logger.debug('%d requests in flight', len(self.in_flight))
+        req = self.in_flight.get(packet.msg_no)
+        if req is None:
+            if self.metrics is not None:
+                self.metrics.unmatched += 1
+            logger.error("Couldn't find message %d in queue!", packet.msg_no)
+            return
+        req.state = HanazederRequestState.SUCCESSFUL
+        now = time.monotonic()
+        if req.retries == 0:
+            # Only unambiguous samples, a retry's reply may belong to any attempt
+            self.rtt.update(req.type, now - req.sent)
+        if self.metrics is not None:
+            self.metrics.responses += 1
+            self.metrics.record_latency(req.type, now - req.created)
+        self.release_request(req)
+        if not req.future.done():
+            req.future.set_result(packet)
+
+    async def handle_req_response(self, req: HanazederRequest) -> Any:
+        """
+        Wait for the response to req and return it decoded. Raises
+        RequestTimeoutError, ShutdownError or NotConnectedError on failure.
+        """
+        packet = await req.future
+        req.result = req.decoder(packet)
+        return req.result
     
+    async def read_request(self, request: bytes, decoder: DecoderCB) -> Any:
+        """
+        Send request (command and arguments without message number) and return
+        the response passed through decoder. Concurrent calls with the same
+        request share a single message on the wire, it is cancelled once
+        all of them stopped waiting.
+        """
+        if not self.connected and self.reconnect is None:
+            raise NotConnectedError()
+        pending = self.pending_reads.get(request)
+        if pending is None:
+            pending = self.loop.create_task(self.send_request(request))
+            self.pending_reads[request] = pending
+            self.read_waiters[request] = 0
+            def done(task):
+                if self.pending_reads.get(request) is task:
+                    self.forget_read(request)
+            pending.add_done_callback(done)
+        self.read_waiters[request] += 1
+        try:
+            # One caller giving up must not cancel the request for the others
+            packet = await asyncio.shield(pending)
+        finally:
+            if self.pending_reads.get(request) is pending:
+                self.read_waiters[request] -= 1
+                if not self.read_waiters[request]:
+                    # Nobody waits anymore, free the window slot instead of
+                    # retrying. Callers coming later start a new request.
+                    self.forget_read(request)
+                    pending.cancel()
+        return decoder(packet)
+
+    def forget_read(self, request: bytes):
+        self.pending_reads.pop(request, None)
+        self.read_waiters.pop(request, None)
+
+    async def read_cached(self, kind: str, request: bytes, decoder: DecoderCB) -> Any:
+        """
+        Like read_request, but serves the response from the cache if one is
+        configured. kind selects the TTL, see TTLCache.
+        """
+        if self.cache is None:
+            return await self.read_request(request, decoder)
+        packet = self.cache.get(kind, request)
+        if packet is MISSING:
+            packet = await self.read_request(request, lambda packet: packet)
+            self.cache.put(kind, request, packet)
+        return decoder(packet)
+
+    async def send_request(self, request: bytes) -> HanazederPacket:
+        req = await self.send_body(request, None)
+        return await req.future
+
+    def create_read_information_request(self) -> bytes:
+        return b'\x01\x00'
+
     async def create_read_information_msg(self) -> bool:
-        return hanazeder_encode_msg(self.HEADER, await self.get_next_msg_no(), b'\x01\x00')
+        return self.template(self.create_read_information_request()).encode(await self.get_next_msg_no())
     
     async def read_information(self):
-        req = await self.send_msg(await self.create_read_information_msg(), self.parse_information_packet)
-        await req.event.wait()
-        await self.handle_req_response(req)
+        await self.read_cached('information', self.create_read_information_request(), self.parse_information_packet)
     
     def parse_information_packet(self, msg: HanazederPacket):
         response = msg.msg
@@ -337,87 +694,131 @@ class HanazederFP:
         if (len(response) >= 5):
             self.version = f'{response[3]}.{response[4]}'
     
+    def create_read_sensor_request(self, idx: int) -> bytes:
+        return bytes(b'\x04\x01') + idx.to_bytes(1, byteorder='little')
+
     async def create_read_sensor_msg(self, idx: int) -> bytes:
-        request_bytes = bytes(b'\x04\x01') + idx.to_bytes(1, byteorder='little')
-        return hanazeder_encode_msg(self.HEADER, await self.get_next_msg_no(), request_bytes)
+        return self.template(self.create_read_sensor_request(idx)).encode(await self.get_next_msg_no())
     
     async def read_sensor(self, idx: int) -> float:
-        if not self.connected:
-            raise NotConnectedError()
-        
-        req = await self.send_msg(await self.create_read_sensor_msg(idx), self.parse_sensor_packet)
-        await req.event.wait()
-        await self.handle_req_response(req)
-        return req.result
+        return await self.read_request(self.create_read_sensor_request(idx), self.parse_sensor_packet)
+
+    async def read_sensors(self, indices: Iterable[int]) -> List[float]:
+        """Read several sensors in one pipelined burst, in order of indices."""
+        return await asyncio.gather(*[self.read_sensor(idx) for idx in indices])
     
     def parse_sensor_packet(self, msg: HanazederPacket) -> float:
         value = hanazeder_decode_num(msg.msg)
         return value
     
+    def create_read_config_block_request(self, start: int, count: int) -> bytes:
+        return bytes(b'\x07\x03') + start.to_bytes(2, byteorder='little') + count.to_bytes(1, byteorder='little')
+
     async def create_read_config_block_msg(self, start: int, count: int) -> bytes:
-        request = bytes(b'\x07\x03') + start.to_bytes(2, byteorder='little') + count.to_bytes(1, byteorder='little')
-        return hanazeder_encode_msg(self.HEADER, await self.get_next_msg_no(), request)
+        return self.template(self.create_read_config_block_request(start, count)).encode(await self.get_next_msg_no())
     
     async def read_config_block(self, start: int, count: int) -> List[ConfigEntry]:
-        if not self.connected:
-            raise NotConnectedError()
-        
         def parse_config_block_packet(msg: HanazederPacket) -> List[ConfigEntry]:
             response = msg.msg
             entries = []
-            for x in range(0, int(round(len(response) / 4))):
-                chunk = response[x * 4: (x + 1) * 4]
-                entry = ConfigEntry(start + x, chunk)
-                entries.append(entry)
+            for x in range(0, len(response) // 4):
+                entries.append(ConfigEntry(start + x, response, x * 4))
             return entries
-        req = await self.send_msg(await self.create_read_config_block_msg(start, count), parse_config_block_packet)
-        await req.event.wait()
-        await self.handle_req_response(req)
-        return req.result
+        return await self.read_cached('config_block', self.create_read_config_block_request(start, count), parse_config_block_packet)
+
+    async def read_config_blocks(self, blocks: Iterable[Tuple[int, int]]) -> List[List[ConfigEntry]]:
+        """Read several (start, count) config blocks in one pipelined burst."""
+        return await asyncio.gather(*[self.read_config_block(start, count) for (start, count) in blocks])
+
+    async def dump_config(self, start: int, end: int, chunk=MAX_CONFIG_ENTRIES) -> ConfigTable:
+        """
+        Read config entries start to end - 1 in blocks of at most chunk
+        entries. All blocks are requested at once and go out as the request
+        window allows.
+        """
+        if not 0 < chunk <= MAX_CONFIG_ENTRIES:
+            raise IllegalArgumentException(f'Blocks hold 1 to {MAX_CONFIG_ENTRIES} entries, not {chunk}')
+        data = bytearray((end - start) * ENTRY_SIZE)
+        def store(block_start: int, count: int):
+            def decode(msg: HanazederPacket):
+                if len(msg.msg) != count * ENTRY_SIZE:
+                    logger.warning('Config block %d returned %d of %d entries',
+                        block_start, len(msg.msg) // ENTRY_SIZE, count)
+                # Never resize data, that would shift the blocks stored later
+                size = min(len(msg.msg), count * ENTRY_SIZE)
+                offset = (block_start - start) * ENTRY_SIZE
+                data[offset:offset + size] = msg.msg[:size]
+            return decode
+        blocks = [(block_start, min(chunk, end - block_start)) for block_start in range(start, end, chunk)]
+        await asyncio.gather(*[self.read_request(self.create_read_config_block_request(block_start, count),
+            store(block_start, count)) for (block_start, count) in blocks])
+        return ConfigTable(start, data)
+
+    def create_read_sensor_name_request(self, idx: int) -> bytes:
+        return bytes(b'\x13\x01') + idx.to_bytes(1, byteorder='little')
 
     async def create_read_sensor_name_msg(self, idx: int) -> bytes:
-        request = bytes(b'\x13\x01') + idx.to_bytes(1, byteorder='little')
-        return hanazeder_encode_msg(self.HEADER, await self.get_next_msg_no(), request)
+        return self.template(self.create_read_sensor_name_request(idx)).encode(await self.get_next_msg_no())
     
     async def read_sensor_name(self, idx: int) -> str:
-        if not self.connected:
-            raise NotConnectedError()
+        return await self.read_cached('sensor_name', self.create_read_sensor_name_request(idx), self.parse_sensor_name_packet)
 
-        req = await self.send_msg(await self.create_read_sensor_name_msg(idx), self.parse_sensor_name_packet)
-        await req.event.wait()
-        await self.handle_req_response(req)
-        return req.result
+    async def read_sensor_names(self, indices: Iterable[int]) -> List[str]:
+        """Read several custom sensor names in one pipelined burst."""
+        return await asyncio.gather(*[self.read_sensor_name(idx) for idx in indices])
     
     def parse_sensor_name_packet (self, msg: HanazederPacket) -> str:
         if msg.msg and len(msg.msg) > 1:
-            return msg.msg[1:].decode('ascii', errors='ignore').strip()
+            return str(msg.msg[1:], 'ascii', errors='ignore').strip()
     
+    def create_read_debug_block_request(self, start: int, count: int) -> bytes:
+        return bytes(b'\x20\x03') + dec_to_bytes(start) + count.to_bytes(1, byteorder='little')
+
     async def create_read_debug_block_msg(self, start: int, count: int) -> bytes:
-        request = bytes(b'\x20\x03') + dec_to_bytes(start) + count.to_bytes(1, byteorder='little')
-        return hanazeder_encode_msg(self.HEADER, await self.get_next_msg_no(), request)
+        return self.template(self.create_read_debug_block_request(start, count)).encode(await self.get_next_msg_no())
     
     async def read_debug_block(self, start: int, count: int, decoder: DecoderCB) -> Any:
-        if not self.connected:
-            raise NotConnectedError()
-        req = await self.send_msg(await self.create_read_debug_block_msg(start, count), decoder)
-        await req.event.wait()
-        await self.handle_req_response(req)
-        return req.result
+        return await self.read_request(self.create_read_debug_block_request(start, count), decoder)
     
     async def read_energy(self) -> EnergyReading:
-        return await self.read_debug_block(313, 8, self.parse_energy_packet)
+        return await self.read_debug_block(*ENERGY_RANGE, self.parse_energy_packet)
     
     def parse_energy_packet(self, msg: HanazederPacket) -> Tuple[int, int, int]:
-        total = hanazeder_decode_num(msg.msg[0:2], False)
-        current = hanazeder_decode_num(msg.msg[2:4])
-        impulse = hanazeder_decode_num(msg.msg[4:6])
-        return (total, current, impulse)
+        if len(msg.msg) < ENERGY_SIZE:
+            raise InvalidReplyError(f'Energy reply holds {len(msg.msg)} of {ENERGY_SIZE} bytes')
+        (total, current, impulse) = struct.unpack_from('<Hhh', msg.msg)
+        return (hanazeder_decode_raw(total), hanazeder_decode_raw(current), hanazeder_decode_raw(impulse))
     
     async def read_outlets(self) -> EnergyReading:
-        return await self.read_debug_block(211, 10, self.parse_outlets_packet)
+        return await self.read_debug_block(*OUTLETS_RANGE, self.parse_outlets_packet)
     
     def parse_outlets_packet(self, msg: HanazederPacket) -> Tuple[int, int, int, int, int, int, int, int, int, int]:
-        states = ()
-        for state in msg.msg:
-            states = states + (False if state == 0 else True, )
-        return states
+        return tuple(state != 0 for state in msg.msg)
+
+    async def read_energy_and_outlets(self) -> Tuple[EnergyReading, Tuple[bool, ...]]:
+        """Read energy and outlets with a single request through the shadow memory."""
+        self.shadow.register(*ENERGY_RANGE)
+        self.shadow.register(*OUTLETS_RANGE)
+        await self.shadow.refresh([ENERGY_RANGE, OUTLETS_RANGE])
+        return (self.parse_energy_packet(self.shadow.packet(*ENERGY_RANGE)),
+            self.parse_outlets_packet(self.shadow.packet(*OUTLETS_RANGE)))
+
+    def stream(self,
+            sensors: Iterable[int] = range(0, 15),
+            energy=False,
+            outlets=False,
+            interval: float = 0,
+            buffer=1,
+            policy=BLOCK,
+            rounds: Optional[int] = None) -> SnapshotStream:
+        """
+        Async iterator of snapshots holding the sensors, named sensor_<idx>,
+        and optionally energy and outlets. See SnapshotStream for buffering
+        and the policies for slow consumers.
+        """
+        signals = [(f'sensor_{idx}', partial(self.read_sensor, idx)) for idx in sensors]
+        if energy:
+            signals.append(('energy', self.read_energy))
+        if outlets:
+            signals.append(('outlets', self.read_outlets))
+        return SnapshotStream(signals, interval, buffer, policy, rounds)
@@ -0,0 +1,25 @@
+import random
+from typing import Callable
+
+class Backoff:
+    """
+    Delays between reconnect attempts, growing by factor from initial up to
+    maximum. Every delay is shortened by a random share of up to jitter so
+    many clients losing the same network do not retry in lockstep.
+    """
+    def __init__(self, initial=0.5, maximum=30.0, factor=2.0, jitter=0.5,
+            random: Callable[[], float] = random.random):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.random = random
+        self.attempts = 0
+
+    def next(self) -> float:
+        delay = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        return delay * (1 - self.jitter * self.random())
+
+    def reset(self):
+        self.attempts = 0
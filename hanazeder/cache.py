@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Returned by TTLCache.get for keys not cached
+MISSING = object()
+
+DEFAULT_TTLS = {
+    'config_block': 3600,
+    'sensor_name': 3600,
+    'information': 3600,
+}
+
+class TTLCache:
+    """
+    Size bounded LRU cache whose entries expire after a time to live that is
+    set per kind of entry. Kinds without a TTL are not cached at all.
+    """
+    def __init__(self,
+            ttls: Optional[Dict[str, float]] = None,
+            max_entries=256,
+            clock: Callable[[], float] = time.monotonic):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries: 'OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, kind: str, key: Hashable) -> Any:
+        entry = self.entries.get((kind, key))
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        (expires, value) = entry
+        if expires <= self.clock():
+            del self.entries[(kind, key)]
+            self.misses += 1
+            return MISSING
+        self.entries.move_to_end((kind, key))
+        self.hits += 1
+        return value
+
+    def put(self, kind: str, key: Hashable, value: Any):
+        ttl = self.ttls.get(kind)
+        if not ttl:
+            return
+        self.entries[(kind, key)] = (self.clock() + ttl, value)
+        self.entries.move_to_end((kind, key))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, kind: Optional[str] = None, key: Optional[Hashable] = None):
+        """Drop the entry for kind and key, all entries of kind or everything."""
+        if kind is None:
+            self.entries.clear()
+        elif key is not None:
+            self.entries.pop((kind, key), None)
+        else:
+            for entry_key in [entry_key for entry_key in self.entries if entry_key[0] == kind]:
+                del self.entries[entry_key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,107 @@
+from typing import Any, Dict, Optional
+
+from .poller import PollSignal, SampleCB
+from .stream import Snapshot
+
+class SignalFilter:
+    """
+    Deadband of a single signal. A number counts as changed once it differs
+    from the last emitted value by more than absolute or by more than
+    relative times that value, whichever is larger. Other values such as
+    outlet states count as changed when they are not equal. Going to or
+    coming back from None (SENSOR_GONE) is always a change.
+    """
+    __slots__ = ('absolute', 'relative', 'heartbeat', 'value', 'emitted_at', 'emitted', 'suppressed')
+
+    def __init__(self, absolute=0.0, relative=0.0, heartbeat: Optional[float] = None):
+        self.absolute = absolute
+        self.relative = relative
+        # Emit at least every heartbeat seconds even without a change
+        self.heartbeat = heartbeat
+        self.value = None
+        self.emitted_at: Optional[float] = None
+        self.emitted = 0
+        self.suppressed = 0
+
+    def changed(self, value: Any) -> bool:
+        last = self.value
+        if last is None or value is None:
+            return (last is None) != (value is None)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            threshold = max(self.absolute, self.relative * abs(last))
+            return abs(value - last) > threshold
+        return value != last
+
+    def update(self, value: Any, timestamp: float) -> bool:
+        """Return whether the sample should be passed on."""
+        if self.emitted_at is None \
+                or self.changed(value) \
+                or (self.heartbeat is not None and timestamp - self.emitted_at >= self.heartbeat):
+            self.value = value
+            self.emitted_at = timestamp
+            self.emitted += 1
+            return True
+        self.suppressed += 1
+        return False
+
+
+class ChangeDetector:
+    """
+    Passes on only meaningful changes of signals. The defaults apply to all
+    signals, configure() sets a deadband or heartbeat for a single one.
+    Use filter() on snapshots of HanazederFP.stream() or sample_callback()
+    as on_sample of a HanazederPoller.
+    """
+    def __init__(self, absolute=0.0, relative=0.0, heartbeat: Optional[float] = None):
+        self.absolute = absolute
+        self.relative = relative
+        self.heartbeat = heartbeat
+        self.filters: Dict[str, SignalFilter] = {}
+
+    def configure(self, name: str, absolute=None, relative=None, heartbeat=None) -> SignalFilter:
+        signal_filter = self.filter_for(name)
+        if absolute is not None:
+            signal_filter.absolute = absolute
+        if relative is not None:
+            signal_filter.relative = relative
+        if heartbeat is not None:
+            signal_filter.heartbeat = heartbeat
+        return signal_filter
+
+    def filter_for(self, name: str) -> SignalFilter:
+        signal_filter = self.filters.get(name)
+        if signal_filter is None:
+            signal_filter = self.filters[name] = SignalFilter(self.absolute, self.relative, self.heartbeat)
+        return signal_filter
+
+    def update(self, name: str, value: Any, timestamp: float) -> bool:
+        return self.filter_for(name).update(value, timestamp)
+
+    def filter(self, snapshot: Snapshot) -> Dict[str, Any]:
+        """Changed values of a snapshot, failed reads are left out."""
+        return {name: value for (name, value) in snapshot.values.items()
+                if name not in snapshot.errors and self.update(name, value, snapshot.timestamp)}
+
+    def sample_callback(self, on_change: SampleCB) -> SampleCB:
+        """Poller callback calling on_change for changed samples only."""
+        def on_sample(signal: PollSignal, value: Any, timestamp: float):
+            if self.update(signal.name, value, timestamp):
+                on_change(signal, value, timestamp)
+        return on_sample
+
+    @property
+    def suppression_ratio(self) -> float:
+        """Share of samples not passed on."""
+        emitted = sum(signal_filter.emitted for signal_filter in self.filters.values())
+        suppressed = sum(signal_filter.suppressed for signal_filter in self.filters.values())
+        total = emitted + suppressed
+        return suppressed / total if total else 0.0
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                'emitted': signal_filter.emitted,
+                'suppressed': signal_filter.suppressed,
+                'suppression_ratio': signal_filter.suppressed / (signal_filter.emitted + signal_filter.suppressed),
+            } for (name, signal_filter) in self.filters.items() if signal_filter.emitted
+        }
@@ -0,0 +1,124 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from .Hanazeder import ConfigEntry, DecoderCB, DeviceType, HanazederFP, HardwarePlatform
+from .config import ConfigTable
+from .types import EnergyReading
+
+class HanazederClient:
+    """
+    Blocking client for code without asyncio. It owns one HanazederFP on an
+    event loop running in a thread of its own, every method hands its read
+    over to that loop and waits for the result. Any number of threads can
+    share a client, their requests are pipelined on the one connection.
+    Options besides the target are passed on to HanazederFP. call_timeout
+    limits how long a call blocks, None waits for the request timeouts.
+    """
+    def __init__(self,
+            serial_port: Optional[str] = None,
+            address: Optional[str] = None,
+            port: Optional[int] = None,
+            call_timeout: Optional[float] = None,
+            **options):
+        self.call_timeout = call_timeout
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='hanazeder-client', daemon=True)
+        self.thread.start()
+        try:
+            self.conn: HanazederFP = self.run(self.connect(serial_port, address, port, options))
+        except BaseException:
+            self.stop_loop()
+            raise
+
+    async def connect(self, serial_port, address, port, options) -> HanazederFP:
+        conn = HanazederFP(**options)
+        await conn.open(serial_port=serial_port, address=address, port=port)
+        return conn
+
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """Run coro on the loop of the client and return its result."""
+        if threading.current_thread() is self.thread:
+            raise RuntimeError('Blocking call from the event loop of the client')
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(self.call_timeout)
+        except concurrent.futures.TimeoutError:
+            # Stop the read so it does not hold a window slot or retry
+            future.cancel()
+            raise
+
+    def call(self, method: Callable[..., Awaitable[Any]], *args) -> Any:
+        return self.run(method(*args))
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        try:
+            self.run(self.disconnect())
+        finally:
+            self.stop_loop()
+
+    async def disconnect(self):
+        self.conn.shutdown()
+        self.conn.connection.close()
+        # Let the transport finish closing
+        await asyncio.sleep(0)
+
+    def stop_loop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def batch(self, calls: Iterable[Tuple[str, tuple]]) -> List[Any]:
+        """
+        Run several reads given as (method name, arguments) at once and
+        return their results, e.g. [('read_sensor', (1,)), ('read_energy', ())].
+        """
+        async def gather():
+            return await asyncio.gather(*[getattr(self.conn, name)(*args) for (name, args) in calls])
+        return self.run(gather())
+
+    def read_information(self) -> Tuple[DeviceType, HardwarePlatform, Optional[str]]:
+        """Read the device info, returned as device type, platform and version."""
+        async def read():
+            await self.conn.read_information()
+            return (self.conn.device_type, self.conn.hardware_platform, getattr(self.conn, 'version', None))
+        return self.run(read())
+
+    def read_sensor(self, idx: int) -> Optional[float]:
+        return self.call(self.conn.read_sensor, idx)
+
+    def read_sensors(self, indices: Iterable[int]) -> List[Optional[float]]:
+        return self.call(self.conn.read_sensors, list(indices))
+
+    def read_sensor_name(self, idx: int) -> str:
+        return self.call(self.conn.read_sensor_name, idx)
+
+    def read_sensor_names(self, indices: Iterable[int]) -> List[str]:
+        return self.call(self.conn.read_sensor_names, list(indices))
+
+    def read_config_block(self, start: int, count: int) -> List[ConfigEntry]:
+        return self.call(self.conn.read_config_block, start, count)
+
+    def dump_config(self, start: int, end: int) -> ConfigTable:
+        return self.call(self.conn.dump_config, start, end)
+
+    def read_debug_block(self, start: int, count: int, decoder: DecoderCB) -> Any:
+        return self.call(self.conn.read_debug_block, start, count, decoder)
+
+    def read_energy(self) -> EnergyReading:
+        return self.call(self.conn.read_energy)
+
+    def read_outlets(self) -> Tuple[bool, ...]:
+        return self.call(self.conn.read_outlets)
+
+    def read_energy_and_outlets(self) -> Tuple[EnergyReading, Tuple[bool, ...]]:
+        return self.call(self.conn.read_energy_and_outlets)
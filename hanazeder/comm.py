@@ -1,13 +1,14 @@
 from enum import IntEnum
+from typing import List
 from .types import SerialOrNetwork
 from .encoding import *
 
 import logging
-from crccheck.crc import Crc8Maxim
 
 logger = logging.getLogger('hanazeder.comm')
 
 SENSOR_GONE = b'\xFF\x7F'
+SENSOR_GONE_RAW = 0x7FFF
 
 class ReadtimeoutException(Exception):
     pass
@@ -21,6 +22,47 @@ class InvalidHeaderException(Exception):
 class IllegalArgumentException(Exception):
     pass
 
+def _crc8_maxim_table() -> bytes:
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8C if crc & 1 else crc >> 1
+        table[i] = crc
+    return bytes(table)
+
+# CRC-8/Maxim (reflected polynomial 0x31, init 0, no final xor)
+CRC8_MAXIM_TABLE = _crc8_maxim_table()
+
+def crc8_maxim(data, crc=0) -> int:
+    """
+    Calculate the CRC-8/Maxim checksum of data. Pass the result of a previous
+    call as crc to continue a running checksum.
+    """
+    table = CRC8_MAXIM_TABLE
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc
+
+class Crc8Maxim:
+    """
+    Streaming CRC-8/Maxim checksum, feed it bytes, bytearrays or memoryview
+    slices and read the running value.
+    """
+    def __init__(self, crc=0):
+        self.value = crc
+
+    def process(self, data) -> int:
+        self.value = crc8_maxim(data, self.value)
+        return self.value
+
+    def finalbytes(self) -> bytes:
+        return self.value.to_bytes(1, byteorder='little')
+
+    @staticmethod
+    def calc(data) -> int:
+        return crc8_maxim(data)
+
 class ReaderState(IntEnum):
     LOOKING_FOR_HEADER = 0
     EXPECTING_MSG_NO = 1
@@ -33,10 +75,18 @@ class ReaderState(IntEnum):
 
 
 class HanazederPacket:
-    msg_no = None
-    msg_type = None
-    msg_size = None
-    msg = None
+    """
+    A received frame. msg is the payload, sliced from the received data in
+    one piece.
+    """
+    __slots__ = ('msg_no', 'msg_type', 'msg_size', 'msg')
+
+    def __init__(self, msg_no=None, msg_type=None, msg_size=None, msg=None):
+        self.msg_no = msg_no
+        self.msg_type = msg_type
+        self.msg_size = msg_size
+        self.msg = msg
+
 class HanazederReader:
     state = ReaderState.LOOKING_FOR_HEADER
     state_before_escaping = None
@@ -56,7 +106,7 @@ class HanazederReader:
         if self.state != ReaderState.LOOKING_FOR_HEADER \
                 and self.state != ReaderState.EXPECTING_CHECKSUM \
                 and self.state != ReaderState.ESCAPING:
-            self.crc.process(byte.to_bytes(1, byteorder='little'))
+            self.crc = CRC8_MAXIM_TABLE[self.crc ^ byte]
         if self.debug:
             logger.debug('Handle_byte %X state in %s', byte, self.state.name)
         
@@ -76,7 +126,7 @@ class HanazederReader:
             if byte == self.header:
                 self.packet = HanazederPacket()
                 self.state = ReaderState.EXPECTING_MSG_NO
-                self.crc = Crc8Maxim()
+                self.crc = 0
         elif self.state == ReaderState.EXPECTING_MSG_NO:
             self.packet.msg_no = byte
             self.state = ReaderState.EXPECTING_TYPE
@@ -99,8 +149,7 @@ class HanazederReader:
                 self.state = ReaderState.READING_PAYLOAD
         elif self.state == ReaderState.EXPECTING_CHECKSUM:
             self.state = ReaderState.LOOKING_FOR_HEADER
-            calculated_crc = self.crc.finalbytes()
-            if calculated_crc[0] != byte:
+            if self.crc != byte:
                 logger.error('Wrong checksum')
             else:
                 # Packet fully read
@@ -109,16 +158,140 @@ class HanazederReader:
             logger.debug('Handle_byte state out %s', self.state.name)
 
 
+class HanazederFrameDecoder:
+    """
+    Chunk oriented replacement for HanazederReader. Feed it whatever the
+    transport hands over and it returns all packets completed by that chunk.
+    Incomplete frames are kept until the next chunk arrives. The controller
+    escapes the checksum, set escaped_checksum to False to decode frames
+    written by hanazeder_encode_msg.
+    """
+    def __init__(self, header, debug=False, escaped_checksum=True):
+        self.header = header[0]
+        self.header_bytes = bytes(header)
+        self.debug = debug
+        self.escaped_checksum = escaped_checksum
+        self.pending = b''
+        self.checksum_errors = 0
+        self.resyncs = 0
+
+    def feed(self, data) -> List[HanazederPacket]:
+        if self.pending:
+            data = self.pending + bytes(data)
+        elif not isinstance(data, bytes):
+            data = bytes(data)
+        packets = []
+        length = len(data)
+        view = memoryview(data)
+        pos = 0
+        while pos < length:
+            start = data.find(self.header_bytes, pos)
+            if start < 0:
+                # No header in the remainder, nothing worth keeping
+                pos = length
+                break
+            (result, next_pos) = self._decode_frame(data, view, start + 1)
+            if result is None:
+                if next_pos < 0:
+                    # Frame not complete yet, wait for more data
+                    pos = start
+                    break
+                # Lone header byte inside a frame, resynchronize on it
+                logger.error('Unexpected header in frame, resynchronizing')
+                self.resyncs += 1
+                pos = next_pos
+                continue
+            pos = next_pos
+            if result is not False:
+                packets.append(result)
+        self.pending = data[pos:]
+        return packets
+
+    def _decode_frame(self, data: bytes, view: memoryview, pos: int):
+        (fields, pos) = self._take(data, view, pos, 3)
+        if fields is None:
+            return (None, pos)
+        msg_size = fields[2]
+        (payload, pos) = self._take(data, view, pos, msg_size)
+        if payload is None:
+            return (None, pos)
+        if pos >= len(data):
+            return (None, -1)
+        checksum = data[pos]
+        pos += 1
+        if checksum == self.header and self.escaped_checksum:
+            if pos >= len(data):
+                return (None, -1)
+            if data[pos] != self.header:
+                return (None, pos - 1)
+            pos += 1
+        packet = HanazederPacket(fields[0], fields[1], msg_size, payload)
+        calculated_crc = crc8_maxim(packet.msg, crc8_maxim(fields))
+        if calculated_crc != checksum:
+            logger.error('Wrong checksum')
+            self.checksum_errors += 1
+            return (False, pos)
+        if self.debug:
+            logger.debug('Decoded packet #%d type %d: %s', packet.msg_no, packet.msg_type, packet.msg)
+        return (packet, pos)
+
+    def _take(self, data: bytes, view: memoryview, pos: int, count: int):
+        """
+        Take count unescaped bytes from data starting at pos. Returns them in
+        a single bytes object and the position after them. If data ends early
+        the bytes are None and the position is -1, if an unescaped header
+        interrupts the frame the bytes are None and the position points to
+        that header.
+        """
+        length = len(data)
+        end = pos + count
+        escape = data.find(self.header_bytes, pos, end)
+        if escape < 0:
+            if end > length:
+                return (None, -1)
+            return (data[pos:end], end)
+        # Slow path, undo escaping into a buffer of the final size
+        out = bytearray(count)
+        filled = 0
+        while True:
+            out[filled:filled + escape - pos] = view[pos:escape]
+            filled += escape - pos
+            if escape + 1 >= length:
+                return (None, -1)
+            if data[escape + 1] != self.header:
+                return (None, escape)
+            out[filled] = self.header
+            filled += 1
+            pos = escape + 2
+            end = pos + count - filled
+            escape = data.find(self.header_bytes, pos, end)
+            if escape < 0:
+                if end > length:
+                    return (None, -1)
+                out[filled:] = view[pos:end]
+                return (bytes(out), end)
+
+
 def hanazeder_decode_num(value, signed=True) -> float:
     if value == SENSOR_GONE:
         return None
     int_val = int.from_bytes(value, byteorder='little', signed=signed)
     return int_val / 10
 
+def hanazeder_decode_raw(raw: int) -> float:
+    """Decode a number already read as integer, e.g. with struct.unpack_from."""
+    if raw == SENSOR_GONE_RAW:
+        return None
+    return raw / 10
+
 def hanazeder_decode_byte(byte: bytes) -> int:
     return int.from_bytes(byte, byteorder='little')
 
 def hanazeder_read(expected_header: bytes, msg_num: int, connection: SerialOrNetwork) -> bytes:
+    """
+    Blocking read of a single reply. Escaped bytes are not handled, use
+    HanazederClient for blocking reads instead.
+    """
     # start by reading at least four bytes
     header = connection.read(4)
     if len(header) < 4:
@@ -131,15 +304,38 @@ def hanazeder_read(expected_header: bytes, msg_num: int, connection: SerialOrNet
     value = connection.read(value_size)
     # Always followed by one byte checksum
     checksum = connection.read(1)
-    crc = Crc8Maxim()
-    crc.process(header[1:])
-    crc.process(value)
-    calculated_crc = crc.finalbytes()
+    calculated_crc = crc8_maxim(value, crc8_maxim(header[1:])).to_bytes(1, byteorder='little')
     if calculated_crc != checksum:
         raise ChecksumNotMatchingException(f'Expected checksum {calculated_crc} but got {checksum}')
     # TODO: unescape header in value
     return value
 
+class HanazederMsgTemplate:
+    """
+    Request encoded once without message number. Frames for a message number
+    only patch in that number, continuing the checksum from it.
+    """
+    def __init__(self, header: bytes, request: bytes):
+        if len(header) != 1:
+            raise IllegalArgumentException("header must be single byte")
+        self.header = bytes(header)
+        self.request = bytes(request)
+        self.escaped_request = self.request.replace(self.header, self.header + self.header)
+        self.frames = {}
+
+    def encode(self, msg_num: int) -> bytes:
+        frame = self.frames.get(msg_num)
+        if frame is None:
+            if msg_num < 0 or msg_num > 255:
+                raise IllegalArgumentException("msg_num must be between 0 and 255")
+            msg_num_byte = msg_num.to_bytes(1, byteorder='little')
+            checksum = crc8_maxim(self.request, CRC8_MAXIM_TABLE[msg_num])
+            if msg_num == self.header[0]:
+                msg_num_byte += self.header
+            frame = self.header + msg_num_byte + self.escaped_request + checksum.to_bytes(1, byteorder='little')
+            self.frames[msg_num] = frame
+        return frame
+
 def hanazeder_encode_msg(header: bytes, msg_num: int, request: bytes) -> bytes:
     if msg_num < 0 or msg_num > 255:
         raise IllegalArgumentException("msg_num must be between 0 and 255")
@@ -149,9 +345,15 @@ def hanazeder_encode_msg(header: bytes, msg_num: int, request: bytes) -> bytes:
     checksum_msg = bytearray()
     checksum_msg.append(msg_num)
     checksum_msg += bytearray(request)
-    checksum = Crc8Maxim.calcbytes(checksum_msg)
+    checksum = crc8_maxim(checksum_msg).to_bytes(1, byteorder='little')
     # Escape header in request
     escaped_msg = bytearray(header) + bytearray(checksum_msg.replace(b'\xEE', b'\xEE\xEE')) + bytearray(checksum)
     # msg += bytearray(checksum)
     
-    return bytes(escaped_msg)
\ No newline at end of file
+    return bytes(escaped_msg)
+def hanazeder_encode_reply(header: bytes, msg_num: int, payload: bytes) -> bytes:
+    """Encode a reply as the controller sends it, with escaped checksum."""
+    reply = hanazeder_encode_msg(header, msg_num, b'\xF0' + len(payload).to_bytes(1, byteorder='little') + payload)
+    if reply[-1] == header[0]:
+        reply += header
+    return reply
@@ -0,0 +1,95 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Bytes per config entry: value, max, min and change step
+ENTRY_SIZE = 4
+FIELDS = ('value', 'max_value', 'min_value', 'change_step')
+# Most entries a reply can hold, its size field is a single byte
+MAX_CONFIG_ENTRIES = 255 // ENTRY_SIZE
+
+ConfigRow = Tuple[int, int, int, int]
+
+class ConfigTable:
+    """
+    Config entries start to start + count - 1 in a single bytearray with
+    ENTRY_SIZE bytes per entry, as sent by the controller. The fields of
+    all entries are available as strided memoryviews, ConfigEntry(key,
+    table.data, table.offset(key)) gives a single entry.
+    """
+    def __init__(self, start: int, data: bytearray):
+        if len(data) % ENTRY_SIZE:
+            raise ValueError('Config data has to hold whole entries')
+        self.start = start
+        self.data = data
+
+    def __len__(self):
+        return len(self.data) // ENTRY_SIZE
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self)
+
+    def __contains__(self, key: int) -> bool:
+        return self.start <= key < self.end
+
+    def offset(self, key: int) -> int:
+        if key not in self:
+            raise KeyError(key)
+        return (key - self.start) * ENTRY_SIZE
+
+    def __getitem__(self, key: int) -> int:
+        """Value of entry key."""
+        return self.data[self.offset(key)]
+
+    def row(self, key: int) -> ConfigRow:
+        offset = self.offset(key)
+        return tuple(self.data[offset:offset + ENTRY_SIZE])
+
+    def column(self, field: str) -> memoryview:
+        return memoryview(self.data)[FIELDS.index(field)::ENTRY_SIZE]
+
+    @property
+    def values(self) -> memoryview:
+        return self.column('value')
+
+    def keys(self) -> range:
+        return range(self.start, self.end)
+
+    def rows(self) -> Iterator[Tuple[int, ConfigRow]]:
+        for key in self.keys():
+            yield (key, self.row(key))
+
+    def diff(self, other: 'ConfigTable', block=256) -> List[Tuple[int, Optional[ConfigRow], Optional[ConfigRow]]]:
+        """
+        Entries differing between this and a newer table as (key, old row,
+        new row), None for entries only in one of them. Equal blocks of
+        bytes are skipped without looking at single entries.
+        """
+        changes = []
+        start = max(self.start, other.start)
+        end = min(self.end, other.end)
+        if start < end:
+            mine = memoryview(self.data)[(start - self.start) * ENTRY_SIZE:(end - self.start) * ENTRY_SIZE]
+            theirs = memoryview(other.data)[(start - other.start) * ENTRY_SIZE:(end - other.start) * ENTRY_SIZE]
+            block -= block % ENTRY_SIZE
+            for offset in range(0, len(mine), block):
+                if mine[offset:offset + block] == theirs[offset:offset + block]:
+                    continue
+                for entry in range(offset, min(offset + block, len(mine)), ENTRY_SIZE):
+                    if mine[entry:entry + ENTRY_SIZE] != theirs[entry:entry + ENTRY_SIZE]:
+                        key = start + entry // ENTRY_SIZE
+                        changes.append((key, self.row(key), other.row(key)))
+        for key in self.keys():
+            if key not in other:
+                changes.append((key, self.row(key), None))
+        for key in other.keys():
+            if key not in self:
+                changes.append((key, None, other.row(key)))
+        changes.sort(key=lambda change: change[0])
+        return changes
+
+    def to_dict(self) -> Dict:
+        return {'start': self.start, 'data': self.data.hex()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ConfigTable':
+        return cls(data['start'], bytearray.fromhex(data['data']))
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .Hanazeder import ConnectionInvalidError, HanazederFP
+from .backoff import Backoff
+from .cache import TTLCache
+from .metrics import HanazederMetrics
+from .poller import HanazederPoller, PollSignal
+
+logger = logging.getLogger('hanazeder.fleet')
+
+FleetSampleCB = Callable[['FleetDevice', PollSignal, Any, float], None]
+
+class FleetDevice:
+    """One controller of a fleet with its own connection and poller."""
+    def __init__(self, name: str, conn: HanazederFP, serial_port: Optional[str],
+            address: Optional[str], port: Optional[int]):
+        self.name = name
+        self.conn = conn
+        self.poller = HanazederPoller(conn)
+        self.serial_port = serial_port
+        self.address = address
+        self.port = port
+        # closed, open or failed
+        self.state = 'closed'
+        self.error: Optional[BaseException] = None
+        self.last_sample: Optional[float] = None
+
+    @property
+    def signals(self) -> List[PollSignal]:
+        return self.poller.signals
+
+    def is_healthy(self, now: float, stale_after: float) -> bool:
+        if self.state != 'open' or not self.conn.connected:
+            return False
+        if not self.signals or self.poller.started is None:
+            return True
+        last = self.last_sample if self.last_sample is not None else self.poller.started
+        return now - last <= stale_after
+
+
+class HanazederFleet:
+    """
+    Many controllers, serial or TCP, on one event loop. Every controller has
+    its own HanazederFP with its own request window and its own poller, so a
+    slow or dead device only delays its own reads. All connections use the
+    same timeout and retry settings, their deadline timers share the timer
+    queue of the loop. A device counts as unhealthy if it is not connected or
+    delivered no sample for stale_after seconds.
+    """
+    def __init__(self,
+            request_timeout=2,
+            max_retries=3,
+            max_in_flight=4,
+            open_timeout=5,
+            stale_after=60,
+            cache_factory: Optional[Callable[[], TTLCache]] = None,
+            metrics=False,
+            reconnect=False,
+            on_sample: Optional[FleetSampleCB] = None):
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.max_in_flight = max_in_flight
+        self.open_timeout = open_timeout
+        self.stale_after = stale_after
+        self.cache_factory = cache_factory
+        self.metrics = metrics
+        # Reconnect lost devices with a Backoff of their own
+        self.reconnect = reconnect
+        self.on_sample = on_sample
+        self.devices: Dict[str, FleetDevice] = {}
+
+    def add(self, name: str, serial_port: Optional[str] = None, address: Optional[str] = None,
+            port: Optional[int] = None) -> FleetDevice:
+        if name in self.devices:
+            raise ValueError(f'Device {name} already added')
+        if not serial_port and not (address and port):
+            raise ConnectionInvalidError("Specify either address and port or serial port")
+        conn = HanazederFP(
+            request_timeout=self.request_timeout,
+            max_in_flight=self.max_in_flight,
+            max_retries=self.max_retries,
+            cache=self.cache_factory() if self.cache_factory else None,
+            metrics=HanazederMetrics() if self.metrics else None,
+            reconnect=Backoff() if self.reconnect else None)
+        device = FleetDevice(name, conn, serial_port, address, port)
+        device.poller.on_sample = lambda signal, value, timestamp: self.sampled(device, signal, value, timestamp)
+        self.devices[name] = device
+        return device
+
+    def select(self, names: Optional[Iterable[str]]) -> List[FleetDevice]:
+        if names is None:
+            return list(self.devices.values())
+        return [self.devices[name] for name in names]
+
+    def add_sensor(self, idx: int, interval: float, priority=0, names: Optional[Iterable[str]] = None):
+        """Poll sensor idx on every device or the devices named."""
+        for device in self.select(names):
+            device.poller.add_sensor(idx, interval, priority)
+
+    def add_energy(self, interval: float, priority=0, names: Optional[Iterable[str]] = None):
+        for device in self.select(names):
+            device.poller.add_energy(interval, priority)
+
+    def add_outlets(self, interval: float, priority=0, names: Optional[Iterable[str]] = None):
+        for device in self.select(names):
+            device.poller.add_outlets(interval, priority)
+
+    async def open(self) -> List[FleetDevice]:
+        """
+        Open all closed and failed devices concurrently. Devices that cannot
+        be opened are marked failed, the opened ones are returned.
+        """
+        devices = [device for device in self.devices.values() if device.state != 'open']
+        await asyncio.gather(*[self.open_device(device) for device in devices])
+        return [device for device in devices if device.state == 'open']
+
+    async def open_device(self, device: FleetDevice):
+        try:
+            await asyncio.wait_for(
+                device.conn.open(serial_port=device.serial_port, address=device.address, port=device.port),
+                self.open_timeout)
+        except (OSError, asyncio.TimeoutError) as err:
+            logger.warning('Opening %s failed: %s', device.name, err)
+            device.state = 'failed'
+            device.error = err
+            return
+        device.conn.connected = True
+        device.state = 'open'
+        device.error = None
+
+    def start(self):
+        """Start polling all open devices."""
+        for device in self.devices.values():
+            if device.state == 'open' and device.poller.task is None:
+                device.poller.start()
+
+    async def close(self):
+        await asyncio.gather(*[device.poller.stop() for device in self.devices.values()])
+        for device in self.devices.values():
+            if device.state == 'open':
+                device.conn.shutdown()
+                device.conn.connection.close()
+                device.state = 'closed'
+
+    def sampled(self, device: FleetDevice, signal: PollSignal, value: Any, timestamp: float):
+        device.last_sample = time.monotonic()
+        if self.on_sample:
+            self.on_sample(device, signal, value, timestamp)
+
+    def health(self) -> Dict:
+        """State per device and how many devices are open, failed and healthy."""
+        now = time.monotonic()
+        devices = {}
+        for device in self.devices.values():
+            conn = device.conn
+            devices[device.name] = {
+                'target': getattr(conn, 'target', None),
+                'state': device.state,
+                'connected': device.state == 'open' and conn.connected,
+                'healthy': device.is_healthy(now, self.stale_after),
+                'error': str(device.error) if device.error else None,
+                'in_flight': len(conn.in_flight),
+                'last_sample_age': now - device.last_sample if device.last_sample is not None else None,
+                'samples': sum(signal.samples for signal in device.signals),
+                'errors': sum(signal.errors for signal in device.signals),
+                'metrics': conn.metrics_snapshot(),
+            }
+        return {
+            'devices': devices,
+            'total': len(devices),
+            'open': sum(1 for entry in devices.values() if entry['state'] == 'open'),
+            'failed': sum(1 for entry in devices.values() if entry['state'] == 'failed'),
+            'healthy': sum(1 for entry in devices.values() if entry['healthy']),
+        }
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from .Hanazeder import HanazederFP
+from .cache import MISSING, TTLCache
+from .comm import HanazederFrameDecoder, HanazederPacket, hanazeder_encode_reply
+
+logger = logging.getLogger('hanazeder.gateway')
+
+# Cache kind by request type, sensor values and debug memory change all the
+# time, device info, config and names hardly ever
+REQUEST_KINDS = {
+    0x01: 'metadata',
+    0x04: 'value',
+    0x07: 'metadata',
+    0x13: 'metadata',
+    0x20: 'value',
+}
+
+class HanazederGateway:
+    """
+    Lets many clients share the connection of conn. Serves the controller
+    protocol on a local TCP port, so clients connect to it like to the TCP
+    bridge of a controller. Requests get a message number of the upstream
+    connection and replies are sent back with the number the client used.
+    Identical reads in flight at the same time go upstream once, replies
+    are kept for value_ttl seconds (metadata_ttl for device info, config and
+    names). Other commands are forwarded one by one and never cached.
+    Requests failing upstream stay unanswered, like on the device.
+    """
+    def __init__(self, conn: HanazederFP, value_ttl=0.5, metadata_ttl=60.0, max_entries=1024):
+        self.conn = conn
+        self.cache = TTLCache({'value': value_ttl, 'metadata': metadata_ttl}, max_entries=max_entries)
+        self.server = None
+        self.clients = set()
+        self.requests = 0
+        # Requests answered from the cache or by a request already in flight
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.upstream = 0
+        self.failed = 0
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.get_running_loop().create_server(
+            lambda: GatewayProtocol(self), host, port)
+        (self.host, self.port) = self.server.sockets[0].getsockname()[:2]
+        return (self.host, self.port)
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            for client in list(self.clients):
+                client.transport.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle_request(self, packet: HanazederPacket) -> Optional[bytes]:
+        """Return the reply payload for a client request or None if it failed."""
+        self.requests += 1
+        request = bytes([packet.msg_type, len(packet.msg)]) + packet.msg
+        kind = REQUEST_KINDS.get(packet.msg_type)
+        try:
+            if kind is None:
+                # Other commands may change the device, each goes upstream
+                # on its own and is never cached
+                self.upstream += 1
+                return (await self.conn.send_request(request)).msg
+            payload = self.cache.get(kind, request)
+            if payload is not MISSING:
+                self.cache_hits += 1
+                return payload
+            if request in self.conn.pending_reads:
+                self.coalesced += 1
+            else:
+                self.upstream += 1
+            payload = (await self.conn.read_request(request, lambda packet: packet)).msg
+        except Exception as err:
+            self.failed += 1
+            logger.debug('Request %s failed upstream: %s', request.hex(), err)
+            return None
+        self.cache.put(kind, request, payload)
+        return payload
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'clients': len(self.clients),
+            'requests': self.requests,
+            'cache_hits': self.cache_hits,
+            'coalesced': self.coalesced,
+            'upstream': self.upstream,
+            'failed': self.failed,
+        }
+
+
+class GatewayProtocol(asyncio.Protocol):
+    def __init__(self, gateway: HanazederGateway):
+        self.gateway = gateway
+        # Requests carry an unescaped checksum
+        self.decoder = HanazederFrameDecoder(gateway.conn.HEADER, escaped_checksum=False)
+        self.tasks = set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.gateway.clients.add(self)
+
+    def data_received(self, data):
+        for packet in self.decoder.feed(data):
+            task = asyncio.get_running_loop().create_task(self.reply(packet))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def connection_lost(self, exc):
+        self.gateway.clients.discard(self)
+        for task in self.tasks:
+            task.cancel()
+
+    async def reply(self, packet: HanazederPacket):
+        payload = await self.gateway.handle_request(packet)
+        if payload is not None and not self.transport.is_closing():
+            self.transport.write(hanazeder_encode_reply(self.gateway.conn.HEADER, packet.msg_no, payload))
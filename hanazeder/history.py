@@ -0,0 +1,199 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .comm import SENSOR_GONE_RAW
+from .types import flatten
+
+# Stored for outlet states that could not be read
+OUTLET_MISSING = 0xFF
+
+class Ring:
+    """
+    Fixed capacity ring of parallel array columns, the first column holds
+    non-decreasing timestamps. Once full the oldest row is overwritten.
+    """
+    def __init__(self, capacity: int, typecodes: Sequence[str]):
+        self.capacity = capacity
+        self.columns = [array(typecode, bytes(array(typecode).itemsize * capacity)) for typecode in typecodes]
+        # Index the next row is written to
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, *row):
+        timestamps = self.columns[0]
+        if self.count and row[0] < timestamps[self.head - 1]:
+            raise ValueError('Timestamps have to be monotonic')
+        for (column, value) in zip(self.columns, row):
+            column[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def physical(self, index: int) -> int:
+        return (self.head - self.count + index) % self.capacity
+
+    def bisect(self, timestamp: float) -> int:
+        """Logical index of the first row not older than timestamp."""
+        timestamps = self.columns[0]
+        (low, high) = (0, self.count)
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[self.physical(middle)] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> List[array]:
+        """Copies of all columns for rows with start <= timestamp < end."""
+        first = self.bisect(start) if start is not None else 0
+        last = self.bisect(end) if end is not None else self.count
+        if first >= last:
+            return [column[0:0] for column in self.columns]
+        (begin, stop) = (self.physical(first), self.physical(last - 1) + 1)
+        if begin < stop:
+            return [column[begin:stop] for column in self.columns]
+        # Rows wrap around the end of the arrays
+        return [column[begin:] + column[:stop] for column in self.columns]
+
+
+class Tier:
+    """Min, max and mean of the raw values per bucket of width seconds."""
+    def __init__(self, width: float, capacity: int, typecode: str, missing: int):
+        self.width = width
+        self.missing = missing
+        self.ring = Ring(capacity, ('d', typecode, typecode, 'f', 'I'))
+        self.bucket: Optional[float] = None
+        self.reset()
+
+    def reset(self):
+        self.min = None
+        self.max = None
+        self.total = 0
+        self.count = 0
+
+    def add(self, timestamp: float, raw: int):
+        bucket = timestamp - timestamp % self.width
+        if bucket != self.bucket:
+            self.flush()
+            self.bucket = bucket
+        if raw == self.missing:
+            return
+        if self.count == 0:
+            self.min = self.max = raw
+        elif raw < self.min:
+            self.min = raw
+        elif raw > self.max:
+            self.max = raw
+        self.total += raw
+        self.count += 1
+
+    def flush(self):
+        if self.bucket is None:
+            return
+        if self.count:
+            self.ring.append(self.bucket, self.min, self.max, self.total / self.count, self.count)
+        else:
+            self.ring.append(self.bucket, self.missing, self.missing, float('nan'), 0)
+        self.reset()
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> List[array]:
+        """Bucket starts, mins, maxs, means and sample counts of closed buckets."""
+        return self.ring.range(start, end)
+
+
+class TimeSeries:
+    """
+    Raw device encodings of one signal in a ring of capacity samples, e.g.
+    tenths as 16 bit integers. Every tier keeps min, max and mean per bucket
+    of its width in seconds, computed while appending. missing marks
+    samples without value and is left out of the aggregates. Samples are
+    stamped with the wall clock, one older than the last sample after the
+    clock was stepped back is stored at the time of the last sample.
+    """
+    def __init__(self, capacity: int, typecode='h', tiers: Iterable[Tuple[float, int]] = (),
+            missing: int = SENSOR_GONE_RAW):
+        self.typecode = typecode
+        self.missing = missing
+        self.ring = Ring(capacity, ('d', typecode))
+        self.tiers = [Tier(width, tier_capacity, typecode, missing) for (width, tier_capacity) in tiers]
+        self.last: Optional[float] = None
+        # Samples moved forward to keep the timestamps monotonic
+        self.clamped = 0
+
+    def __len__(self):
+        return len(self.ring)
+
+    def append(self, timestamp: float, raw: int):
+        if self.last is not None and timestamp < self.last:
+            timestamp = self.last
+            self.clamped += 1
+        self.last = timestamp
+        self.ring.append(timestamp, raw)
+        for tier in self.tiers:
+            tier.add(timestamp, raw)
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[array, array]:
+        """Timestamps and raw values with start <= timestamp < end."""
+        return tuple(self.ring.range(start, end))
+
+    def tier(self, width: float) -> Tier:
+        for tier in self.tiers:
+            if tier.width == width:
+                return tier
+        raise KeyError(width)
+
+    @property
+    def nbytes(self) -> int:
+        columns = self.ring.columns + [column for tier in self.tiers for column in tier.ring.columns]
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+def encode_tenths(value: Optional[float]) -> int:
+    """Reverse of hanazeder_decode_raw."""
+    return SENSOR_GONE_RAW if value is None else round(value * 10)
+
+
+class HistoryStore:
+    """
+    Recent history of the readings of one controller. Sensors and the parts
+    of the energy reading are kept in tenths, every outlet in a series of
+    its own holding 0 or 1, so the mean of a bucket is its duty cycle.
+    """
+    # Raw samples for a day at 5 s intervals, minutes for a week, hours for a year
+    def __init__(self, capacity=17280, tiers: Iterable[Tuple[float, int]] = ((60, 10080), (3600, 8760))):
+        self.capacity = capacity
+        self.tiers = tuple(tiers)
+        self.series: Dict[str, TimeSeries] = {}
+
+    def get(self, name: str, typecode='h', missing=SENSOR_GONE_RAW) -> TimeSeries:
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = TimeSeries(self.capacity, typecode, self.tiers, missing)
+        return series
+
+    def record(self, name: str, value: Any, timestamp: float):
+        """Store a value as returned by read_sensor, read_energy or read_outlets."""
+        for (signal, scalar) in flatten(name, value):
+            if signal.startswith('outlet_'):
+                self.get(signal, 'B', OUTLET_MISSING).append(
+                    timestamp, OUTLET_MISSING if scalar is None else scalar)
+            else:
+                # The energy total is unsigned
+                self.get(signal, 'H' if signal == 'energy_total' else 'h').append(timestamp, encode_tenths(scalar))
+
+    def on_sample(self, signal, value: Any, timestamp: float):
+        """Use as on_sample of a HanazederPoller."""
+        self.record(signal.name, value, timestamp)
+
+    def add_snapshot(self, snapshot):
+        for (name, value) in snapshot.values.items():
+            if name not in snapshot.errors:
+                self.record(name, value, snapshot.timestamp)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(series.nbytes for series in self.series.values())
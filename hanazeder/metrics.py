@@ -0,0 +1,113 @@
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence
+
+# Upper bounds in seconds, the last bucket takes everything above
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+RECOVERY_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+class Histogram:
+    """Histogram with fixed bucket bounds, recording costs one bisect."""
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'Histogram'):
+        """Add the values of a histogram with the same bounds."""
+        for (idx, count) in enumerate(other.counts):
+            self.counts[idx] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Estimate of the given percentile, interpolated linearly inside the
+        bucket holding it. The largest value seen bounds the estimate.
+        """
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for (idx, count) in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.bounds[idx - 1] if idx else 0.0
+                upper = min(self.bounds[idx], self.max) if idx < len(self.bounds) else self.max
+                return lower + max(upper - lower, 0.0) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': dict(zip(self.bounds + (float('inf'),), self.counts)),
+        }
+
+
+class HanazederMetrics:
+    """
+    Counters and latency histograms of a HanazederFP. Pass an instance as
+    metrics to record, without one nothing is recorded.
+    """
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        # Round trip latency by request type, including retries
+        self.latency: Dict[int, Histogram] = {}
+        self.requests = 0
+        self.responses = 0
+        self.retransmits = 0
+        self.timeouts = 0
+        self.unmatched = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.writes = 0
+        self.disconnects = 0
+        self.reconnects = 0
+        # Time from losing the connection until it was back
+        self.recovery = Histogram(RECOVERY_BUCKETS)
+
+    def record_latency(self, type: int, latency: float):
+        histogram = self.latency.get(type)
+        if histogram is None:
+            histogram = self.latency[type] = Histogram(self.bounds)
+        histogram.record(latency)
+
+    def snapshot(self, reader=None) -> Dict:
+        """
+        Current values as plain dict. Pass the frame decoder of the connection
+        as reader to include its checksum errors and resyncs.
+        """
+        snapshot = {
+            'requests': self.requests,
+            'responses': self.responses,
+            'retransmits': self.retransmits,
+            'timeouts': self.timeouts,
+            'unmatched': self.unmatched,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'writes': self.writes,
+            'disconnects': self.disconnects,
+            'reconnects': self.reconnects,
+            'recovery': self.recovery.snapshot(),
+            'latency': {type: histogram.snapshot() for (type, histogram) in self.latency.items()},
+        }
+        if reader is not None:
+            snapshot['checksum_errors'] = reader.checksum_errors
+            snapshot['resyncs'] = reader.resyncs
+        return snapshot
@@ -0,0 +1,181 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .Hanazeder import DecoderCB, HanazederFP
+
+logger = logging.getLogger('hanazeder.poller')
+
+SampleCB = Callable[['PollSignal', Any, float], None]
+
+class PollSignal:
+    """
+    A value polled every interval seconds. Lower priority values are read
+    first when the bus cannot keep up with all signals.
+    """
+    def __init__(self, name: str, read: Callable[[], Awaitable[Any]], interval: float, priority=0):
+        self.name = name
+        self.read = read
+        self.interval = interval
+        self.priority = priority
+        self.next_due = 0.0
+        self.value = None
+        self.timestamp = None
+        self.samples = 0
+        self.skipped = 0
+        self.errors = 0
+
+    @property
+    def requested_rate(self) -> float:
+        return 1 / self.interval
+
+
+class HanazederPoller:
+    """
+    Polls signals of a HanazederFP at their own intervals. Deadlines are kept
+    in a priority queue and start staggered so requests spread over the bus.
+    At most max_concurrent reads run at once, defaulting to the request
+    window of the connection. If a signal falls behind by whole intervals
+    these are skipped instead of being read back to back, under sustained
+    overload signals with lower priority values win.
+    """
+    def __init__(self,
+            conn: Optional[HanazederFP],
+            max_concurrent: Optional[int] = None,
+            on_sample: Optional[SampleCB] = None,
+            clock: Callable[[], float] = time.monotonic):
+        self.conn = conn
+        if max_concurrent is None:
+            max_concurrent = conn.max_in_flight if conn else 1
+        self.max_concurrent = max_concurrent
+        self.on_sample = on_sample
+        self.clock = clock
+        self.signals: List[PollSignal] = []
+        self.queue = []
+        self.sequence = 0
+        self.started = None
+        self.task = None
+        self.reads = set()
+        self.wakeup = asyncio.Event()
+
+    def add(self, signal: PollSignal) -> PollSignal:
+        self.signals.append(signal)
+        if self.started is not None:
+            signal.next_due = self.clock()
+            self.schedule(signal)
+        return signal
+
+    def add_sensor(self, idx: int, interval: float, priority=0, name=None) -> PollSignal:
+        return self.add(PollSignal(name or f'sensor_{idx}', lambda: self.conn.read_sensor(idx), interval, priority))
+
+    def add_energy(self, interval: float, priority=0, name='energy') -> PollSignal:
+        return self.add(PollSignal(name, self.conn.read_energy, interval, priority))
+
+    def add_outlets(self, interval: float, priority=0, name='outlets') -> PollSignal:
+        return self.add(PollSignal(name, self.conn.read_outlets, interval, priority))
+
+    def add_debug_block(self, start: int, count: int, decoder: DecoderCB, interval: float,
+            priority=0, name=None) -> PollSignal:
+        return self.add(PollSignal(name or f'debug_{start}_{count}',
+            lambda: self.conn.read_debug_block(start, count, decoder), interval, priority))
+
+    def schedule(self, signal: PollSignal):
+        self.sequence += 1
+        heapq.heappush(self.queue, (signal.next_due, signal.priority, self.sequence, signal))
+        self.wakeup.set()
+
+    def start(self) -> asyncio.Task:
+        self.task = asyncio.get_running_loop().create_task(self.run(), name='poller')
+        return self.task
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for read in list(self.reads):
+            read.cancel()
+
+    async def run(self):
+        self.started = self.clock()
+        count = len(self.signals)
+        for (index, signal) in enumerate(self.signals):
+            # Stagger the first reads over the interval
+            signal.next_due = self.started + signal.interval * index / count
+            self.schedule(signal)
+        slots = asyncio.Semaphore(self.max_concurrent)
+        loop = asyncio.get_running_loop()
+        while True:
+            await slots.acquire()
+            signal = await self.next_due()
+            read = loop.create_task(self.poll(signal))
+            self.reads.add(read)
+            read.add_done_callback(self.reads.discard)
+            read.add_done_callback(lambda _: slots.release())
+
+    async def next_due(self) -> PollSignal:
+        """Wait for the next deadline and pick the most important due signal."""
+        while True:
+            now = self.clock()
+            if self.queue and self.queue[0][0] <= now:
+                break
+            # Wake up early if a signal gets scheduled in the meantime
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.queue[0][0] - now if self.queue else None)
+            except asyncio.TimeoutError:
+                pass
+        due = []
+        while self.queue and self.queue[0][0] <= now:
+            due.append(heapq.heappop(self.queue))
+        best = min(due, key=lambda entry: (entry[1], entry[0], entry[2]))
+        for entry in due:
+            if entry is not best:
+                heapq.heappush(self.queue, entry)
+        return best[3]
+
+    async def poll(self, signal: PollSignal):
+        try:
+            value = await signal.read()
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            signal.errors += 1
+            logger.warning('Polling %s failed: %s', signal.name, err)
+        else:
+            signal.value = value
+            signal.timestamp = time.time()
+            signal.samples += 1
+            if self.on_sample:
+                self.on_sample(signal, value, signal.timestamp)
+        finally:
+            self.reschedule(signal)
+
+    def reschedule(self, signal: PollSignal):
+        now = self.clock()
+        next_due = signal.next_due + signal.interval
+        if next_due < now:
+            # Overloaded, drop the intervals missed entirely and stretch this
+            # one by reading again as soon as a slot is free
+            signal.skipped += int((now - next_due) / signal.interval)
+            next_due = now
+        signal.next_due = next_due
+        self.schedule(signal)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Requested and achieved rate per signal since the poller started."""
+        elapsed = self.clock() - self.started if self.started is not None else 0
+        return {
+            signal.name: {
+                'requested_rate': signal.requested_rate,
+                'achieved_rate': signal.samples / elapsed if elapsed > 0 else 0,
+                'samples': signal.samples,
+                'skipped': signal.skipped,
+                'errors': signal.errors,
+            } for signal in self.signals
+        }
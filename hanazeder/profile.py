@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from .Hanazeder import DeviceType, HanazederFP, HardwarePlatform, SENSOR_LABELS
+
+logger = logging.getLogger('hanazeder.profile')
+
+# Config block holding the label index of each sensor
+SENSOR_LABEL_BLOCK = 27
+
+class DeviceProfile:
+    """
+    Everything discovered about a controller before the first data read:
+    device info from read_information and the names of its sensors.
+    """
+    def __init__(self,
+            target: str,
+            device_type: DeviceType,
+            hardware_platform: HardwarePlatform,
+            version: Optional[str],
+            connection_flags: int,
+            sensor_labels: List[Optional[str]],
+            custom_names: List[Optional[str]],
+            saved: Optional[float] = None):
+        self.target = target
+        self.device_type = device_type
+        self.hardware_platform = hardware_platform
+        self.version = version
+        self.connection_flags = connection_flags
+        # Names from SENSOR_LABELS, None where the sensor has no standard label
+        self.sensor_labels = sensor_labels
+        # Custom names read with read_sensor_name for sensors without label
+        self.custom_names = custom_names
+        self.saved = saved
+
+    @property
+    def key(self) -> str:
+        return f'{self.target}|{self.device_type.name}|{self.version}'
+
+    @property
+    def sensor_names(self) -> List[Optional[str]]:
+        return [label if label is not None else custom
+                for (label, custom) in zip(self.sensor_labels, self.custom_names)]
+
+    def matches(self, conn: HanazederFP) -> bool:
+        """Check the device info last read by conn against this profile."""
+        return conn.device_type == self.device_type \
+            and conn.hardware_platform == self.hardware_platform \
+            and getattr(conn, 'version', None) == self.version
+
+    def apply(self, conn: HanazederFP):
+        """Set the device info on conn as if read_information had run."""
+        conn.device_type = self.device_type
+        conn.hardware_platform = self.hardware_platform
+        conn.connection_flags = self.connection_flags
+        if self.version is not None:
+            conn.version = self.version
+
+    def to_dict(self) -> Dict:
+        return {
+            'target': self.target,
+            'device_type': self.device_type.name,
+            'hardware_platform': self.hardware_platform.name,
+            'version': self.version,
+            'connection_flags': self.connection_flags,
+            'sensor_labels': self.sensor_labels,
+            'custom_names': self.custom_names,
+            'saved': self.saved,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DeviceProfile':
+        return cls(
+            data['target'],
+            DeviceType[data['device_type']],
+            HardwarePlatform[data['hardware_platform']],
+            data['version'],
+            data['connection_flags'],
+            data['sensor_labels'],
+            data['custom_names'],
+            data.get('saved'))
+
+
+class DeviceProfileStore:
+    """Device profiles kept in a JSON file, keyed by target, type and version."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def read_all(self) -> Dict[str, DeviceProfile]:
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning('Ignoring unreadable profile store %s', self.path)
+            return {}
+        return {key: DeviceProfile.from_dict(entry) for (key, entry) in data.items()}
+
+    def load(self, target: str) -> Optional[DeviceProfile]:
+        """Return the most recently saved profile for target."""
+        profiles = [profile for profile in self.read_all().values() if profile.target == target]
+        if not profiles:
+            return None
+        return max(profiles, key=lambda profile: profile.saved or 0)
+
+    def save(self, profile: DeviceProfile):
+        profile.saved = time.time()
+        profiles = self.read_all()
+        profiles[profile.key] = profile
+        self.write_all(profiles)
+
+    def remove(self, profile: DeviceProfile):
+        profiles = self.read_all()
+        if profiles.pop(profile.key, None) is not None:
+            self.write_all(profiles)
+
+    def write_all(self, profiles: Dict[str, DeviceProfile]):
+        # Replace atomically so a crash never leaves a truncated store
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({key: entry.to_dict() for (key, entry) in profiles.items()}, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+async def discover_profile(conn: HanazederFP, sensor_count=15) -> DeviceProfile:
+    """Run the full discovery: device info, sensor labels and custom names."""
+    await conn.read_information()
+    labels: List[Optional[str]] = [None] * sensor_count
+    for (idx, config) in enumerate(await conn.read_config_block(SENSOR_LABEL_BLOCK, sensor_count)):
+        if 0 < config.value < len(SENSOR_LABELS):
+            labels[idx] = SENSOR_LABELS[config.value]
+    unlabeled = [idx for idx in range(sensor_count) if labels[idx] is None]
+    custom_names: List[Optional[str]] = [None] * sensor_count
+    for (idx, name) in zip(unlabeled, await conn.read_sensor_names(unlabeled)):
+        custom_names[idx] = name
+    return DeviceProfile(conn.target, conn.device_type, conn.hardware_platform,
+        getattr(conn, 'version', None), conn.connection_flags, labels, custom_names)
+
+
+async def verify_profile(conn: HanazederFP, store: DeviceProfileStore, profile: DeviceProfile) -> DeviceProfile:
+    """
+    Check that the device behind conn still is the one of profile. If not,
+    discover it again and store the new profile.
+    """
+    await conn.read_information()
+    if profile.matches(conn):
+        return profile
+    logger.warning('Device at %s changed, discovering it again', profile.target)
+    store.remove(profile)
+    profile = await discover_profile(conn, len(profile.sensor_labels))
+    store.save(profile)
+    return profile
+
+
+async def load_profile(conn: HanazederFP, store: DeviceProfileStore, sensor_count=15) -> DeviceProfile:
+    """
+    Return the stored profile for the target of the opened connection conn
+    and apply it, so data reads can start right away. The stored profile is
+    verified in the background, the task is kept as conn.profile_check. On
+    the first start the device is discovered and the profile saved.
+    """
+    profile = store.load(conn.target)
+    if profile is None:
+        profile = await discover_profile(conn, sensor_count)
+        store.save(profile)
+        return profile
+    profile.apply(conn)
+    conn.profile_check = asyncio.get_running_loop().create_task(
+        verify_profile(conn, store, profile), name='profile_check')
+    return profile
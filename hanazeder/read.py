@@ -1,18 +1,24 @@
 import asyncio
-from typing import List
+import json
+import time
+from typing import Dict, List
 from .Hanazeder import ConfigEntry, HanazederFP, SENSOR_LABELS
+from .cache import TTLCache
+from .metrics import HanazederMetrics, Histogram
+from .profile import DeviceProfileStore, load_profile
+from .stream import Snapshot
 import argparse
 import sys
 import logging
 
 FORMAT = '%(asctime)s %(message)s'
-logging.basicConfig(format=FORMAT, level=logging.DEBUG)
 
 class CliReader:
     sensor_vals = [None] * 15
     sensor_names = [None] * 15
     sensor_custom_name = None
     sensor_idx = None
+    names_known = False
 
     def config_block_read(self, configs: List[ConfigEntry]):
         for i, config_label in enumerate(configs):
@@ -21,10 +27,70 @@ class CliReader:
 
     def print_sensor(self, i):
         print (f'Sensor {self.sensor_names[i]} ({i}) has value {self.sensor_vals[i]}')
-    
+
     async def get_sensor_name(self, i):
         return self.sensor_names[i]
 
+    async def read_sensor_names(self, indices: List[int]):
+        # Read label from fixed list
+        if not self.names_known:
+            self.config_block_read(await self.conn.read_config_block(27, 15))
+        # Also read custom names
+        unnamed = [i for i in indices if self.sensor_names[i] is None]
+        for (i, name) in zip(unnamed, await self.conn.read_sensor_names(unnamed)):
+            self.sensor_names[i] = name
+
+    def profile_checked(self, check: asyncio.Task):
+        if check.cancelled():
+            return
+        if check.exception() is not None:
+            logging.warning('Checking the stored profile failed: %s', check.exception())
+            return
+        self.sensor_names = check.result().sensor_names
+
+    def print_snapshot(self, snapshot: Snapshot):
+        values = snapshot.values
+        if 'outlets' in values:
+            print(f'Outlet states: {values["outlets"]}')
+        if 'energy' in values:
+            energy = values['energy'] or (None, None, None)
+            print('Energy readings:')
+            print(f'  Total   {energy[0]}')
+            print(f'  Current {energy[1]}')
+            print(f'  Impulse {energy[2]}')
+        for i in self.indices:
+            self.sensor_vals[i] = values[f'sensor_{i}']
+            self.print_sensor(i)
+        for (name, error) in snapshot.errors.items():
+            print(f'Reading {name} failed: {type(error).__name__}')
+
+    def json_snapshot(self, snapshot: Snapshot) -> str:
+        return json.dumps({
+            'timestamp': snapshot.timestamp,
+            'sequence': snapshot.sequence,
+            'values': snapshot.values,
+            'errors': {name: type(error).__name__ for (name, error) in snapshot.errors.items()},
+        })
+
+    def summary(self, rounds: int, elapsed: float) -> Dict:
+        metrics: HanazederMetrics = self.conn.metrics
+        latency = Histogram(metrics.bounds)
+        for histogram in metrics.latency.values():
+            latency.merge(histogram)
+        return {
+            'rounds': rounds,
+            'elapsed': elapsed,
+            'rate': rounds / elapsed if elapsed > 0 else 0,
+            'requests': metrics.requests,
+            'requests_per_second': metrics.requests / elapsed if elapsed > 0 else 0,
+            'latency_p50': latency.percentile(50),
+            'latency_p95': latency.percentile(95),
+            'latency_p99': latency.percentile(99),
+            'retries': metrics.retransmits,
+            'timeouts': metrics.timeouts,
+            'crc_errors': self.conn.reader.checksum_errors,
+        }
+
     async def main(self) -> int:
         parser = argparse.ArgumentParser()
         parser.add_argument("--serial-port", help="set serial port",
@@ -34,80 +100,110 @@ class CliReader:
         parser.add_argument("--sensors", help="read all sensors", action="store_true")
         parser.add_argument("--energy", help="read energy values", action="store_true")
         parser.add_argument("--outlets", help="read outlet/pump values", action="store_true")
-        parser.add_argument("--loop", help="read values in a loop", action="store_true")
+        parser.add_argument("--loop", help="read values in a loop until interrupted", action="store_true")
+        parser.add_argument("--count", help="read values COUNT times",
+                        type=int)
+        parser.add_argument("--rate", help="read at most RATE rounds per second, 0 for as fast as possible",
+                        type=float, default=1)
+        parser.add_argument("--json", help="print one JSON object per round and the summary as JSON",
+                        action="store_true")
         parser.add_argument("--debug", help="print low-level messages", action="store_true")
         parser.add_argument("--address", help="connect to HOSTNAME, needs port as well",
                         type=str)
         parser.add_argument("--port", help="connect to HOSTNAME on port PORT",
                         type=int, default=5000)
+        parser.add_argument("--profile", help="keep device info and sensor names in FILE for faster startup",
+                        type=str)
         args = parser.parse_args()
+        logging.basicConfig(format=FORMAT, level=logging.DEBUG if args.debug else logging.WARNING)
 
         if args.address and args.serial_port:
             print('Cannot specify both serial-port and address')
             return 1
-        
+
         if args.address and not args.port:
             print('Specify port together with address')
             return 2
         if not args.sensor and not args.energy and not args.sensors and not args.outlets:
             print("Don't know what to do, please add --energy, --outlets, --sensors and/or --sensor")
+            return 3
 
-        self.conn = HanazederFP(debug=args.debug, request_timeout=2)
+        # Labels and names rarely change, only read them once per hour
+        self.conn = HanazederFP(debug=args.debug, request_timeout=2, cache=TTLCache(), metrics=HanazederMetrics())
         await self.conn.open(serial_port=args.serial_port, address=args.address, port=args.port, timeout=0.2)
-        await self.conn.read_information()
-        print(f'Connected to {self.conn.device_type.name} with version {self.conn.version}')
-
-        loop_count = 1000 if args.loop else 1
-        
-        async def dummy():
-            return None
-        
-        while loop_count > 0:
-            loop_count = loop_count - 1
-            if args.outlets:
-                outlets = await self.conn.read_outlets()
-                print(f'Outlet states: {outlets}')
-            if args.energy:
-                energy = await self.conn.read_energy()
-                print('Energy readings:')
-                print(f'  Total   {energy[0]}')
-                print(f'  Current {energy[1]}')
-                print(f'  Impulse {energy[2]}')
-
-            if args.sensors:
-                # Read label from fixed list
-                name_tasks = []
-                
-                self.config_block_read(await self.conn.read_config_block(27, 15))
-                for i in range(0, 15):
-                    # Also read custom name
-                    if self.sensor_names[i] is None:
-                        self.sensor_names[i] = await self.conn.read_sensor_name(i)
-                    #else:
-                    #    values_tasks.append(self.get_sensor_name(i))
-                values_tasks = []
-                for i in range(0, 15):
-                    values_tasks.append(self.conn.read_sensor(i))
-                
-                self.sensor_vals = await asyncio.gather(*values_tasks)
-                
-                for i in range(0, 15):
-                    self.print_sensor(i)
-            elif args.sensor is not None:
-                self.sensor_idx = args.sensor - 1
-
-                print(f'Reading sensor {args.sensor}')
-                self.sensor_vals[self.sensor_idx] = await self.conn.read_sensor(self.sensor_idx)
-                # Read label from fixed list
-                self.config_block_read(await self.conn.read_config_block(27, 15))
-                # Also read custom name
-                if self.sensor_names[self.sensor_idx] is None:
-                    self.sensor_names[self.sensor_idx] = await self.conn.read_sensor_name(self.sensor_idx)
-                self.print_sensor(self.sensor_idx)
-                
+        if args.profile:
+            profile = await load_profile(self.conn, DeviceProfileStore(args.profile))
+            self.sensor_names = profile.sensor_names
+            self.names_known = True
+            if self.conn.profile_check is not None:
+                # A changed device is discovered again in the background
+                self.conn.profile_check.add_done_callback(self.profile_checked)
+        else:
+            await self.conn.read_information()
+
+        if args.sensors:
+            self.indices = list(range(0, 15))
+        elif args.sensor is not None:
+            self.indices = [args.sensor - 1]
+        else:
+            self.indices = []
+        if self.indices:
+            await self.read_sensor_names(self.indices)
+        if args.json:
+            print(json.dumps({
+                'device_type': self.conn.device_type.name,
+                'version': getattr(self.conn, 'version', None),
+                'sensor_names': {f'sensor_{i}': self.sensor_names[i] for i in self.indices},
+            }))
+        else:
+            print(f'Connected to {self.conn.device_type.name} with version {self.conn.version}')
+
+        if args.count is not None:
+            rounds = args.count
+        else:
+            rounds = None if args.loop else 1
+        # All reads of a round go out together, the next round is read
+        # while this one is printed
+        stream = self.conn.stream(sensors=self.indices, energy=args.energy, outlets=args.outlets,
+            interval=1 / args.rate if args.rate > 0 else 0, rounds=rounds)
+        done = 0
+        start = time.monotonic()
+        try:
+            async with stream:
+                async for snapshot in stream:
+                    if args.json:
+                        print(self.json_snapshot(snapshot), flush=True)
+                    else:
+                        self.print_snapshot(snapshot)
+                    done += 1
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            pass
+        finally:
+            summary = self.summary(done, time.monotonic() - start)
+            if args.json:
+                print(json.dumps({'summary': summary}), file=sys.stderr)
+            elif rounds != 1:
+                print(self.format_summary(summary), file=sys.stderr)
+            self.conn.shutdown()
+            self.conn.connection.close()
         return 0
 
-if __name__ == '__main__':
+    def format_summary(self, summary: Dict) -> str:
+        def ms(value):
+            return f'{value * 1000:.1f} ms' if value is not None else '-'
+        return (f'{summary["rounds"]} rounds in {summary["elapsed"]:.1f} s, {summary["rate"]:.2f} rounds/s, '
+            f'{summary["requests_per_second"]:.1f} requests/s\n'
+            f'latency p50 {ms(summary["latency_p50"])}, p95 {ms(summary["latency_p95"])}, '
+            f'p99 {ms(summary["latency_p99"])}\n'
+            f'{summary["retries"]} retries, {summary["timeouts"]} timeouts, {summary["crc_errors"]} CRC errors')
+
+
+def main():
     instance = CliReader()
-    sys.exit(asyncio.run(instance.main(), debug=True)
-)
+    try:
+        sys.exit(asyncio.run(instance.main()))
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+from typing import Dict, Hashable
+
+class RttEstimator:
+    """
+    Retransmission timeout per kind of request, estimated from smoothed round
+    trip time and its variance like TCP does (RFC 6298). Kinds without a
+    sample yet use initial_rto.
+    """
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self, initial_rto=2.0, min_rto=0.05, max_rto=10.0, granularity=0.001):
+        self.initial_rto = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.granularity = granularity
+        self.srtt: Dict[Hashable, float] = {}
+        self.rttvar: Dict[Hashable, float] = {}
+
+    def update(self, kind: Hashable, rtt: float):
+        srtt = self.srtt.get(kind)
+        if srtt is None:
+            self.srtt[kind] = rtt
+            self.rttvar[kind] = rtt / 2
+        else:
+            self.rttvar[kind] = (1 - self.BETA) * self.rttvar[kind] + self.BETA * abs(srtt - rtt)
+            self.srtt[kind] = (1 - self.ALPHA) * srtt + self.ALPHA * rtt
+
+    def rto(self, kind: Hashable, retries=0) -> float:
+        """Timeout for the next attempt, doubled for every retry so far."""
+        srtt = self.srtt.get(kind)
+        if srtt is None:
+            rto = self.initial_rto
+        else:
+            rto = srtt + max(self.granularity, 4 * self.rttvar[kind])
+        rto = max(self.min_rto, rto) * (2 ** retries)
+        return min(rto, self.max_rto)
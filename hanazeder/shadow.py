@@ -0,0 +1,91 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .comm import HanazederPacket
+
+# Most bytes a reply can hold, its size field is a single byte
+MAX_DEBUG_BLOCK = 255
+
+class ShadowBlock:
+    """Debug memory start to start + count - 1 as read last."""
+    __slots__ = ('start', 'count', 'data', 'updated')
+
+    def __init__(self, start: int, count: int):
+        self.start = start
+        self.count = count
+        self.data = bytearray(count)
+        self.updated: Optional[float] = None
+
+    @property
+    def end(self) -> int:
+        return self.start + self.count
+
+    def store(self, msg: HanazederPacket):
+        # Keep the buffer so views handed out stay valid
+        self.data[:len(msg.msg)] = msg.msg[:self.count]
+        self.updated = time.monotonic()
+
+
+class DebugShadow:
+    """
+    Local copy of the registered ranges of the debug memory of a controller.
+    Ranges with at most max_gap unused bytes between them are merged into
+    blocks of at most max_block bytes, each block is a single
+    read_debug_block request. Reads return memoryviews into the blocks.
+    Registering a new range plans the blocks anew, so views taken before
+    are only valid until then.
+    """
+    def __init__(self, conn, max_block=MAX_DEBUG_BLOCK, max_gap=128):
+        self.conn = conn
+        self.max_block = max_block
+        self.max_gap = max_gap
+        self.ranges: Dict[Tuple[int, int], None] = {}
+        self.blocks: List[ShadowBlock] = []
+
+    def register(self, start: int, count: int):
+        if count > self.max_block:
+            raise ValueError(f'Range of {count} bytes does not fit into a block')
+        if (start, count) not in self.ranges:
+            self.ranges[(start, count)] = None
+            self.plan()
+
+    def plan(self):
+        blocks = []
+        block = None
+        for (start, count) in sorted(self.ranges):
+            end = start + count
+            if block is not None and start - block.end <= self.max_gap and max(end, block.end) - block.start <= self.max_block:
+                block.count = max(end, block.end) - block.start
+            else:
+                block = ShadowBlock(start, count)
+                blocks.append(block)
+        for block in blocks:
+            block.data = bytearray(block.count)
+        self.blocks = blocks
+
+    def block(self, start: int, count: int) -> ShadowBlock:
+        for block in self.blocks:
+            if block.start <= start and start + count <= block.end:
+                return block
+        raise KeyError((start, count))
+
+    async def refresh(self, ranges: Optional[Iterable[Tuple[int, int]]] = None):
+        """Read all blocks or the blocks holding the given ranges."""
+        if ranges is None:
+            blocks = self.blocks
+        else:
+            blocks = list({id(block): block for block in (self.block(*rng) for rng in ranges)}.values())
+        await asyncio.gather(*[self.conn.read_debug_block(block.start, block.count, block.store) for block in blocks])
+
+    def read(self, start: int, count: int) -> memoryview:
+        block = self.block(start, count)
+        offset = start - block.start
+        return memoryview(block.data)[offset:offset + count]
+
+    def packet(self, start: int, count: int) -> HanazederPacket:
+        """The range as if read alone, for decoders like parse_energy_packet."""
+        return HanazederPacket(msg=self.read(start, count))
+
+    def updated(self, start: int, count: int) -> Optional[float]:
+        return self.block(start, count).updated
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import os
+import random
+from typing import List, Optional
+
+from .comm import HanazederFrameDecoder, HanazederPacket, hanazeder_encode_reply
+
+logger = logging.getLogger('hanazeder.simulator')
+
+class FPSimulator:
+    """
+    Simulated FP controller serving the protocol on a local TCP port or a pty.
+    Requests are answered one after another, each after latency seconds plus
+    the time the reply needs on a line running at baudrate (None for no line
+    limit). The controller only buffers rx_queue requests, further requests
+    arriving while it is busy are dropped like on the real device.
+
+    To test error handling a share of drop_rate requests is never answered
+    and a share of corrupt_rate replies has one byte damaged. With
+    escaped_payloads all values are filled with 0xEE bytes, so every reply
+    needs escaping.
+    """
+    HEADER = b'\xEE'
+
+    def __init__(self,
+            latency=0.005,
+            baudrate: Optional[int] = 38400,
+            rx_queue=8,
+            drop_rate=0.0,
+            corrupt_rate=0.0,
+            escaped_payloads=False,
+            seed: Optional[int] = None):
+        self.latency = latency
+        self.baudrate = baudrate
+        self.rx_queue = rx_queue
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.random = random.Random(seed)
+        # FP10, platform FP10, flags 2, version 1.6
+        self.information = b'\x00\x00\x02\x01\x06'
+        # Sensor values in tenths
+        self.sensors: List[int] = [200 + 7 * idx for idx in range(15)]
+        self.sensor_names: List[str] = [f'Sensor {idx}' for idx in range(15)]
+        # Four bytes value/max/min/step per config entry
+        self.config = bytearray(4 * 1024)
+        self.debug_memory = bytearray(1024)
+        if escaped_payloads:
+            self.sensors = [0x01EE + idx for idx in range(15)]
+            self.sensor_names = ['\xEE' * 10] * 15
+            self.config[:] = b'\xEE' * len(self.config)
+            self.debug_memory[:] = b'\xEE' * len(self.debug_memory)
+        self.requests = 0
+        # Requests not fitting into rx_queue
+        self.dropped = 0
+        # Requests left unanswered and replies damaged on purpose
+        self.lost = 0
+        self.corrupted = 0
+        self.server = None
+        self.pty = None
+        self.connections = set()
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.get_running_loop().create_server(
+            lambda: SimulatorProtocol(self), host, port)
+        (self.host, self.port) = self.server.sockets[0].getsockname()[:2]
+        return (self.host, self.port)
+
+    def start_pty(self) -> str:
+        """Serve on a new pty and return the path of its serial side."""
+        # Only on POSIX, the TCP simulator also runs on Windows
+        import tty
+        (master, slave) = os.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+        self.pty = PtyTransport(master, slave, SimulatorProtocol(self))
+        self.path = os.ttyname(slave)
+        return self.path
+
+    def disconnect(self):
+        """Drop all client connections, e.g. to test reconnects."""
+        for protocol in list(self.connections):
+            protocol.transport.close()
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.pty:
+            self.pty.close()
+            self.pty = None
+
+    def handle_request(self, packet: HanazederPacket) -> Optional[bytes]:
+        """Return the reply payload for a request or None to stay silent."""
+        request = bytes(packet.msg)
+        if packet.msg_type == 0x01:
+            return self.information
+        elif packet.msg_type == 0x04:
+            value = self.sensors[request[0]] if request[0] < len(self.sensors) else None
+            if value is None:
+                return b'\xFF\x7F'
+            return value.to_bytes(2, byteorder='little', signed=True)
+        elif packet.msg_type == 0x07:
+            start = int.from_bytes(request[0:2], byteorder='little')
+            return bytes(self.config[start * 4:(start + request[2]) * 4])
+        elif packet.msg_type == 0x13:
+            name = self.sensor_names[request[0]] if request[0] < len(self.sensor_names) else ''
+            return request[0:1] + name.encode('latin-1').ljust(10)
+        elif packet.msg_type == 0x20:
+            start = int.from_bytes(request[0:2], byteorder='little')
+            return bytes(self.debug_memory[start:start + request[2]])
+        logger.warning('Unknown request type %X', packet.msg_type)
+        return None
+
+    def encode_reply(self, msg_no: int, payload: bytes) -> bytes:
+        return hanazeder_encode_reply(self.HEADER, msg_no, payload)
+
+    def corrupt(self, reply: bytes) -> bytes:
+        """Flip bits of one byte after the header."""
+        pos = self.random.randrange(1, len(reply))
+        damaged = bytearray(reply)
+        damaged[pos] ^= self.random.randrange(1, 256)
+        return bytes(damaged)
+
+    def line_time(self, size: int) -> float:
+        if not self.baudrate:
+            return 0
+        # 8N1 needs ten bits per byte
+        return size * 10 / self.baudrate
+
+
+class SimulatorProtocol(asyncio.Protocol):
+    def __init__(self, simulator: FPSimulator):
+        self.simulator = simulator
+        # Requests carry an unescaped checksum
+        self.decoder = HanazederFrameDecoder(simulator.HEADER, escaped_checksum=False)
+        self.pending = asyncio.Queue(maxsize=simulator.rx_queue)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.simulator.connections.add(self)
+        self.worker = asyncio.get_running_loop().create_task(self.work())
+
+    def data_received(self, data):
+        for packet in self.decoder.feed(data):
+            self.simulator.requests += 1
+            try:
+                self.pending.put_nowait(packet)
+            except asyncio.QueueFull:
+                self.simulator.dropped += 1
+
+    def connection_lost(self, exc):
+        self.simulator.connections.discard(self)
+        self.worker.cancel()
+
+    async def work(self):
+        simulator = self.simulator
+        while True:
+            packet = await self.pending.get()
+            if simulator.drop_rate and simulator.random.random() < simulator.drop_rate:
+                simulator.lost += 1
+                continue
+            payload = simulator.handle_request(packet)
+            if payload is None:
+                continue
+            reply = simulator.encode_reply(packet.msg_no, payload)
+            if simulator.corrupt_rate and simulator.random.random() < simulator.corrupt_rate:
+                simulator.corrupted += 1
+                reply = simulator.corrupt(reply)
+            await asyncio.sleep(simulator.latency + simulator.line_time(len(reply)))
+            self.transport.write(reply)
+
+
+class PtyTransport(asyncio.Transport):
+    """Minimal transport on the master side of a pty."""
+    def __init__(self, master: int, slave: int, protocol: asyncio.Protocol):
+        super().__init__()
+        self.master = master
+        # Kept open so the master does not see a hangup between clients
+        self.slave = slave
+        self.protocol = protocol
+        self.loop = asyncio.get_running_loop()
+        os.set_blocking(master, False)
+        self.loop.add_reader(master, self.read_ready)
+        protocol.connection_made(self)
+
+    def read_ready(self):
+        try:
+            data = os.read(self.master, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # Nobody has the serial side open
+            return
+        if data:
+            self.protocol.data_received(data)
+
+    def write(self, data: bytes):
+        # Replies are small, the pty buffer takes them whole
+        os.write(self.master, data)
+
+    def close(self):
+        self.loop.remove_reader(self.master)
+        self.protocol.connection_lost(None)
+        os.close(self.master)
+        os.close(self.slave)
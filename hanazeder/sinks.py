@@ -0,0 +1,214 @@
+import csv
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .types import flatten
+
+logger = logging.getLogger('hanazeder.sinks')
+
+# Timestamp, device, signal and value, None for SENSOR_GONE
+Row = Tuple[float, str, str, Optional[float]]
+
+
+class BatchedSink(ABC):
+    """
+    Collects readings and writes them from a background thread, so the
+    event loop never waits for the disk. A batch is written once batch_size
+    rows are queued or flush_interval seconds passed. Beyond max_queue rows
+    new readings are dropped. Subclasses implement open() and write_batch(),
+    both run on the writer thread.
+    """
+    def __init__(self, batch_size=500, flush_interval=1.0, max_queue=100000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.rows: Deque[Row] = deque()
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name=type(self).__name__, daemon=True)
+        self.thread.start()
+
+    def add(self, name: str, value: Any, timestamp: Optional[float] = None, device=''):
+        if timestamp is None:
+            timestamp = time.time()
+        for (signal, scalar) in flatten(name, value):
+            if len(self.rows) >= self.max_queue:
+                self.dropped += 1
+                continue
+            self.rows.append((timestamp, device, signal, scalar))
+            self.queued += 1
+        if len(self.rows) >= self.batch_size:
+            self.wakeup.set()
+
+    def on_sample(self, signal, value: Any, timestamp: float):
+        """Use as on_sample of a HanazederPoller."""
+        self.add(signal.name, value, timestamp)
+
+    def add_snapshot(self, snapshot, device=''):
+        for (name, value) in snapshot.values.items():
+            if name not in snapshot.errors:
+                self.add(name, value, snapshot.timestamp, device)
+
+    def run(self):
+        try:
+            self.open()
+        except Exception as err:
+            self.errors += 1
+            logger.error('Opening %s failed: %s', type(self).__name__, err)
+            return
+        try:
+            while not self.stopping:
+                self.wakeup.wait(self.flush_interval)
+                self.wakeup.clear()
+                self.flush()
+            self.flush()
+        finally:
+            self.close_output()
+
+    def flush(self):
+        while self.rows:
+            batch = []
+            while self.rows and len(batch) < self.batch_size:
+                batch.append(self.rows.popleft())
+            try:
+                self.write_batch(batch)
+            except Exception as err:
+                self.errors += 1
+                logger.error('Writing %d rows failed: %s', len(batch), err)
+                continue
+            self.written += len(batch)
+            self.batches += 1
+
+    def close(self):
+        """Write everything queued and stop the writer thread."""
+        self.stopping = True
+        self.wakeup.set()
+        self.thread.join()
+
+    @property
+    def pending(self) -> int:
+        return len(self.rows)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queued': self.queued,
+            'written': self.written,
+            'pending': self.pending,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'errors': self.errors,
+        }
+
+    def open(self):
+        pass
+
+    @abstractmethod
+    def write_batch(self, rows: List[Row]):
+        pass
+
+    def close_output(self):
+        pass
+
+
+class SQLiteSink(BatchedSink):
+    """Rows in a SQLite table, one transaction per batch."""
+    def __init__(self, path: str, table='readings', **kwargs):
+        self.path = path
+        self.table = table
+        super().__init__(**kwargs)
+
+    def open(self):
+        self.db = sqlite3.connect(self.path)
+        self.db.execute(f'CREATE TABLE IF NOT EXISTS {self.table} '
+            '(timestamp REAL NOT NULL, device TEXT NOT NULL, signal TEXT NOT NULL, value REAL)')
+        self.db.commit()
+
+    def write_batch(self, rows: List[Row]):
+        with self.db:
+            self.db.executemany(f'INSERT INTO {self.table} VALUES (?, ?, ?, ?)', rows)
+
+    def close_output(self):
+        self.db.close()
+
+
+class CsvSink(BatchedSink):
+    """
+    Rows in a CSV file that is rotated like logging's RotatingFileHandler
+    once it reaches max_bytes, keeping backup_count old files.
+    """
+    HEADER = ('timestamp', 'device', 'signal', 'value')
+
+    def __init__(self, path: str, max_bytes=10 * 1024 * 1024, backup_count=5, **kwargs):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        super().__init__(**kwargs)
+
+    def open(self):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if new:
+            self.writer.writerow(self.HEADER)
+
+    def write_batch(self, rows: List[Row]):
+        self.writer.writerows(rows)
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        for idx in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{idx}'):
+                os.replace(f'{self.path}.{idx}', f'{self.path}.{idx + 1}')
+        if self.backup_count:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.open()
+
+    def close_output(self):
+        self.file.close()
+
+
+class LineProtocolSink(BatchedSink):
+    """
+    Rows in InfluxDB line protocol, one line per reading with nanosecond
+    timestamps. Readings without value cannot be expressed and are skipped.
+    """
+    def __init__(self, path: str, measurement='hanazeder', **kwargs):
+        self.path = path
+        self.measurement = measurement
+        super().__init__(**kwargs)
+
+    def open(self):
+        self.file = open(self.path, 'a')
+
+    @staticmethod
+    def escape(tag: str) -> str:
+        return tag.replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+    def write_batch(self, rows: List[Row]):
+        lines = []
+        for (timestamp, device, signal, value) in rows:
+            if value is None:
+                continue
+            tags = f'{self.measurement},device={self.escape(device)}' if device else self.measurement
+            lines.append(f'{tags},signal={self.escape(signal)} value={float(value)!r} {int(timestamp * 1e9)}\n')
+        self.file.write(''.join(lines))
+        self.file.flush()
+
+    def close_output(self):
+        self.file.close()
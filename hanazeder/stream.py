@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('hanazeder.stream')
+
+# What to do with a new snapshot while the buffer is full
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+POLICIES = (BLOCK, DROP_OLDEST, COALESCE)
+
+SignalRead = Tuple[str, Callable[[], Awaitable[Any]]]
+
+class Snapshot:
+    """Values of all signals of one round, read at timestamp."""
+    __slots__ = ('sequence', 'timestamp', 'values', 'errors', 'coalesced')
+
+    def __init__(self, sequence: int, timestamp: float, values: Dict[str, Any], errors: Dict[str, Exception]):
+        self.sequence = sequence
+        self.timestamp = timestamp
+        # Signal name to value, None for SENSOR_GONE and failed reads
+        self.values = values
+        self.errors = errors
+        # Number of older snapshots merged into this one
+        self.coalesced = 0
+
+    def merge(self, newer: 'Snapshot'):
+        """Take over the values of newer, keeping ours where its reads failed."""
+        for (name, value) in newer.values.items():
+            if name not in newer.errors:
+                self.values[name] = value
+                self.errors.pop(name, None)
+        self.sequence = newer.sequence
+        self.timestamp = newer.timestamp
+        self.coalesced += 1 + newer.coalesced
+
+    def __repr__(self):
+        return f'Snapshot(#{self.sequence} {self.timestamp:.3f} {self.values})'
+
+
+class SnapshotStream:
+    """
+    Async iterator over snapshots of a set of signals. Rounds are read by a
+    background task that starts the next round as soon as the previous one
+    is buffered, so reading overlaps with the consumer handling a snapshot.
+    With interval rounds start at most every interval seconds. At most buffer
+    snapshots are kept, policy decides what happens when the consumer falls
+    behind: BLOCK stops reading, DROP_OLDEST discards the oldest snapshot and
+    COALESCE merges the new values into the newest buffered snapshot.
+    """
+    def __init__(self,
+            signals: List[SignalRead],
+            interval: float = 0,
+            buffer=1,
+            policy=BLOCK,
+            rounds: Optional[int] = None):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown policy {policy}')
+        if buffer < 1:
+            raise ValueError('Buffer needs room for at least one snapshot')
+        self.signals = signals
+        self.interval = interval
+        self.buffer = buffer
+        self.policy = policy
+        self.rounds = rounds
+        self.snapshots: Deque[Snapshot] = deque()
+        self.readable = asyncio.Event()
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.dropped = 0
+        self.coalesced = 0
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.task = None
+
+    def __aiter__(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.produce(), name='snapshot_stream')
+        return self
+
+    async def __anext__(self) -> Snapshot:
+        while not self.snapshots:
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                raise StopAsyncIteration
+            self.readable.clear()
+            await self.readable.wait()
+        snapshot = self.snapshots.popleft()
+        self.writable.set()
+        return snapshot
+
+    async def __aenter__(self):
+        return self.__aiter__()
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.finished = True
+
+    async def read_round(self, sequence: int) -> Snapshot:
+        timestamp = time.time()
+        results = await asyncio.gather(*[read() for (_, read) in self.signals], return_exceptions=True)
+        values = {}
+        errors = {}
+        for ((name, _), result) in zip(self.signals, results):
+            # A read cancelled on its own returns CancelledError
+            if isinstance(result, BaseException):
+                errors[name] = result
+                result = None
+            values[name] = result
+        return Snapshot(sequence, timestamp, values, errors)
+
+    async def produce(self):
+        loop = asyncio.get_running_loop()
+        next_start = loop.time()
+        sequence = 0
+        try:
+            while self.rounds is None or sequence < self.rounds:
+                if self.interval:
+                    delay = next_start - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    # Rounds missed while blocked or reading are not made up
+                    next_start = max(next_start + self.interval, loop.time())
+                snapshot = await self.read_round(sequence)
+                sequence += 1
+                await self.push(snapshot)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.warning('Snapshot stream failed: %s', err)
+            self.error = err
+        finally:
+            self.finished = True
+            self.readable.set()
+
+    async def push(self, snapshot: Snapshot):
+        if len(self.snapshots) >= self.buffer:
+            if self.policy == BLOCK:
+                while len(self.snapshots) >= self.buffer:
+                    self.writable.clear()
+                    await self.writable.wait()
+            elif self.policy == DROP_OLDEST:
+                self.snapshots.popleft()
+                self.dropped += 1
+            else:
+                self.snapshots[-1].merge(snapshot)
+                self.coalesced += 1
+                self.readable.set()
+                return
+        self.snapshots.append(snapshot)
+        self.readable.set()
@@ -1,7 +1,21 @@
 import serial
 import socket
-from typing import Union, Tuple
+from typing import Any, Iterator, Optional, Union, Tuple
 
 SerialOrNetwork = Union[socket.socket, serial.Serial, bytearray]
 
-EnergyReading = Tuple[float, float, float]
\ No newline at end of file
+EnergyReading = Tuple[float, float, float]
+
+# Values of an EnergyReading
+ENERGY_PARTS = ('total', 'current', 'impulse')
+
+def flatten(name: str, value: Any) -> Iterator[Tuple[str, Optional[float]]]:
+    """Split energy readings and outlet states into scalar signals."""
+    if name == 'energy':
+        for (part, part_value) in zip(ENERGY_PARTS, value or (None,) * 3):
+            yield (f'energy_{part}', part_value)
+    elif name == 'outlets':
+        for (idx, state) in enumerate(value or (None,) * 10):
+            yield (f'outlet_{idx}', None if state is None else int(state))
+    else:
+        yield (name, value)
@@ -0,0 +1,48 @@
+from ..hanazeder.Hanazeder import HanazederFP
+from ..hanazeder.simulator import FPSimulator
+
+import asyncio
+import pytest_asyncio
+
+@pytest_asyncio.fixture
+async def start_simulator():
+    """
+    Start an FPSimulator on a local port, or on a pty with pty=True. Without
+    further options it answers without latency or line limit. Every
+    simulator started is closed after the test.
+    """
+    simulators = []
+    async def start(pty=False, **options) -> FPSimulator:
+        simulator = FPSimulator(**{'latency': 0, 'baudrate': None, **options})
+        simulators.append(simulator)
+        if pty:
+            simulator.start_pty()
+        else:
+            await simulator.start()
+        return simulator
+    yield start
+    for simulator in simulators:
+        await simulator.close()
+
+@pytest_asyncio.fixture
+async def connect():
+    """
+    Open a HanazederFP to a simulator or to (host, port), options are passed
+    on to HanazederFP. Every connection is closed after the test.
+    """
+    conns = []
+    async def open_connection(target, **options) -> HanazederFP:
+        conn = HanazederFP(**{'request_timeout': 1, **options})
+        if isinstance(target, FPSimulator) and target.pty:
+            await conn.open(serial_port=target.path)
+        else:
+            (host, port) = (target.host, target.port) if isinstance(target, FPSimulator) else target
+            await conn.open(serial_port=None, address=host, port=port)
+        conns.append(conn)
+        return conn
+    yield open_connection
+    for conn in conns:
+        conn.shutdown()
+        conn.connection.close()
+    # Let the transports finish closing
+    await asyncio.sleep(0)
@@ -0,0 +1,46 @@
+from ..hanazeder.cache import MISSING, TTLCache
+
+class FakeClock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = TTLCache({'sensor_name': 10, 'information': 100}, clock=clock)
+    cache.put('sensor_name', 1, 'Boiler')
+    cache.put('information', None, 'FP10')
+    assert cache.get('sensor_name', 1) == 'Boiler'
+    clock.now = 10
+    assert cache.get('sensor_name', 1) is MISSING
+    assert cache.get('information', None) == 'FP10'
+    assert cache.stats() == {'entries': 1, 'hits': 2, 'misses': 1, 'evictions': 0}
+
+def test_uncached_kind():
+    cache = TTLCache({'sensor_name': 10})
+    cache.put('config_block', 1, 'value')
+    assert cache.get('config_block', 1) is MISSING
+
+def test_lru_eviction():
+    cache = TTLCache({'sensor_name': 10}, max_entries=2)
+    cache.put('sensor_name', 1, 'a')
+    cache.put('sensor_name', 2, 'b')
+    cache.get('sensor_name', 1)
+    cache.put('sensor_name', 3, 'c')
+    assert cache.get('sensor_name', 2) is MISSING
+    assert cache.get('sensor_name', 1) == 'a'
+    assert cache.evictions == 1
+
+def test_invalidate():
+    cache = TTLCache({'sensor_name': 10, 'information': 10})
+    cache.put('sensor_name', 1, 'a')
+    cache.put('sensor_name', 2, 'b')
+    cache.put('information', None, 'c')
+    cache.invalidate('sensor_name', 1)
+    assert cache.get('sensor_name', 1) is MISSING
+    cache.invalidate('sensor_name')
+    assert cache.get('sensor_name', 2) is MISSING
+    assert cache.get('information', None) == 'c'
+    cache.invalidate()
+    assert cache.get('information', None) is MISSING
@@ -0,0 +1,45 @@
+from ..hanazeder.changes import ChangeDetector
+from ..hanazeder.poller import PollSignal
+from ..hanazeder.stream import Snapshot
+
+def test_absolute_deadband():
+    detector = ChangeDetector(absolute=0.25)
+    values = [20.0, 20.1, 20.2, 20.3, 20.0, 19.7]
+    emitted = [value for (t, value) in enumerate(values) if detector.update('sensor_1', value, t)]
+    # Compared with the last emitted value, so slow drifts are not lost
+    assert emitted == [20.0, 20.3, 20.0, 19.7]
+    assert detector.suppression_ratio == 2 / 6
+
+def test_relative_deadband_and_heartbeat():
+    detector = ChangeDetector(heartbeat=10)
+    detector.configure('energy', relative=0.1)
+    assert detector.update('energy', 1000, 0)
+    assert not detector.update('energy', 1090, 1)
+    assert detector.update('energy', 1101, 2)
+    assert not detector.update('energy', 1101, 11)
+    assert detector.update('energy', 1101, 12)
+    assert detector.stats()['energy'] == {'emitted': 3, 'suppressed': 2, 'suppression_ratio': 0.4}
+
+def test_sensor_gone():
+    detector = ChangeDetector(absolute=100)
+    assert detector.update('sensor_3', None, 0)
+    assert not detector.update('sensor_3', None, 1)
+    assert detector.update('sensor_3', 21.5, 2)
+    assert detector.update('sensor_3', None, 3)
+
+def test_outlets_and_snapshots():
+    detector = ChangeDetector()
+    first = Snapshot(0, 0, {'outlets': (True, False), 'sensor_0': 20.0}, {})
+    assert detector.filter(first) == first.values
+    second = Snapshot(1, 1, {'outlets': (True, True), 'sensor_0': None}, {'sensor_0': TimeoutError()})
+    # Failed reads are no SENSOR_GONE
+    assert detector.filter(second) == {'outlets': (True, True)}
+
+def test_poller_callback():
+    changes = []
+    on_sample = ChangeDetector(absolute=0.5).sample_callback(
+        lambda signal, value, timestamp: changes.append(value))
+    signal = PollSignal('sensor_0', None, 1)
+    for (timestamp, value) in enumerate([20.0, 20.2, 21.0]):
+        on_sample(signal, value, timestamp)
+    assert changes == [20.0, 21.0]
@@ -0,0 +1,47 @@
+from ..hanazeder.Hanazeder import DeviceType
+from ..hanazeder.client import HanazederClient
+
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+import asyncio
+import pytest
+
+# The simulator runs on the loop of the test, the blocking client calls run
+# in threads of their own
+
+@pytest.mark.asyncio
+async def test_client_shared_by_threads(start_simulator):
+    simulator = await start_simulator(latency=0.001)
+    def use_client():
+        with HanazederClient(address=simulator.host, port=simulator.port, request_timeout=1) as client:
+            (device_type, _, version) = client.read_information()
+            assert (device_type, version) == (DeviceType.FP10, '1.6')
+            with ThreadPoolExecutor(8) as pool:
+                values = list(pool.map(client.read_sensor, [idx % 15 for idx in range(60)]))
+            assert values == [(200 + 7 * (idx % 15)) / 10 for idx in range(60)]
+            (sensor, outlets) = client.batch([('read_sensor', (2,)), ('read_outlets', ())])
+            assert sensor == 21.4
+            assert outlets == (False,) * 10
+        return client
+    client = await asyncio.get_running_loop().run_in_executor(None, use_client)
+    assert client.loop.is_closed()
+    assert not client.thread.is_alive()
+
+def test_client_connect_failure():
+    with pytest.raises(OSError):
+        HanazederClient(address='127.0.0.1', port=1)
+
+@pytest.mark.asyncio
+async def test_client_call_timeout_cancels(start_simulator):
+    simulator = await start_simulator(latency=0.001)
+    def use_client():
+        with HanazederClient(address=simulator.host, port=simulator.port, request_timeout=1, call_timeout=0.1) as client:
+            simulator.latency = 1
+            with pytest.raises(concurrent.futures.TimeoutError):
+                client.read_sensor(1)
+            async def in_flight():
+                await asyncio.sleep(0.01)
+                return len(client.conn.in_flight)
+            # The read stopped waiting and gave up its message number
+            assert client.run(in_flight()) == 0
+    await asyncio.get_running_loop().run_in_executor(None, use_client)
@@ -36,4 +36,76 @@ def test_hanazeder_write():
     assert msg == hex_to_byte('EE1020033F01038C')
     # Also test initial handshake
     msg = hanazeder_encode_msg(HEADER, 0, b'\x01\x00')
-    assert msg == hex_to_byte('EE 00 01 00 C4')
\ No newline at end of file
+    assert msg == hex_to_byte('EE 00 01 00 C4')
+
+def test_frame_decoder():
+    decoder = HanazederFrameDecoder(HEADER)
+    packets = decoder.feed(hex_to_byte("EE03F0025501A6 EE00F00500000201 06F9"))
+    assert len(packets) == 2
+    assert packets[0].msg_no == 3
+    assert packets[0].msg_type == 0xF0
+    assert packets[0].msg == b'\x55\x01'
+    assert packets[1].msg_no == 0
+    assert packets[1].msg == b'\x00\x00\x02\x01\x06'
+
+def test_frame_decoder_split():
+    decoder = HanazederFrameDecoder(HEADER)
+    data = hex_to_byte("EE03F0025501A6")
+    for byte in data[:-1]:
+        assert decoder.feed(bytes([byte])) == []
+    packets = decoder.feed(data[-1:])
+    assert len(packets) == 1
+    assert packets[0].msg == b'\x55\x01'
+
+def test_frame_decoder_escaped():
+    payload = b'\xEE\x01\xEE'
+    msg = hanazeder_encode_msg(HEADER, 5, b'\xF0' + len(payload).to_bytes(1, 'little') + payload)
+    decoder = HanazederFrameDecoder(HEADER)
+    # Split between the escape pair
+    split = msg.index(b'\xEE\xEE') + 1
+    assert decoder.feed(msg[:split]) == []
+    packets = decoder.feed(msg[split:])
+    assert len(packets) == 1
+    assert packets[0].msg == payload
+
+def test_frame_decoder_checksum():
+    decoder = HanazederFrameDecoder(HEADER)
+    packets = decoder.feed(hex_to_byte("EE03F0025501A7 EE03F0025501A6"))
+    assert len(packets) == 1
+
+def test_frame_decoder_resync():
+    decoder = HanazederFrameDecoder(HEADER)
+    # Truncated frame followed by a complete one
+    packets = decoder.feed(hex_to_byte("EE04F00255 EE03F0025501A6"))
+    assert len(packets) == 1
+    assert packets[0].msg_no == 3
+
+def test_crc8_maxim():
+    assert crc8_maxim(hex_to_byte('03F0025501')) == 0xA6
+    assert crc8_maxim(hex_to_byte('00F00500000201 06')) == 0xF9
+    assert crc8_maxim(b'123456789') == 0xA1
+    assert crc8_maxim(b'') == 0
+
+def test_crc8_maxim_streaming():
+    data = hex_to_byte('03F0025501')
+    crc = Crc8Maxim()
+    crc.process(memoryview(data)[:2])
+    assert crc.process(memoryview(data)[2:]) == 0xA6
+    assert crc.finalbytes() == b'\xA6'
+    assert crc8_maxim(data[3:], crc8_maxim(data[:3])) == 0xA6
+
+def test_msg_template():
+    for request in (b'\x04\x01\x00', hex_to_byte('20033F0103'), b'\x07\x03\xEE\x00\x0F'):
+        template = HanazederMsgTemplate(HEADER, request)
+        for msg_num in range(256):
+            assert template.encode(msg_num) == hanazeder_encode_msg(HEADER, msg_num, request)
+
+def test_frame_decoder_escaped_checksum():
+    decoder = HanazederFrameDecoder(HEADER)
+    # Payload 0x00 0xB4 from msg #2 has checksum 0xEE
+    msg = hanazeder_encode_msg(HEADER, 2, b'\xF0\x02\x00\xB4')
+    assert msg[-1] == 0xEE
+    assert decoder.feed(msg) == []
+    packets = decoder.feed(HEADER)
+    assert len(packets) == 1
+    assert packets[0].msg == b'\x00\xB4'
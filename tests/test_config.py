@@ -0,0 +1,49 @@
+from ..hanazeder.Hanazeder import ConfigEntry
+from ..hanazeder.comm import IllegalArgumentException
+from ..hanazeder.config import ConfigTable
+
+import pytest
+
+@pytest.mark.asyncio
+async def test_dump_config(start_simulator, connect):
+    simulator = await start_simulator()
+    for key in range(1024):
+        simulator.config[key * 4:key * 4 + 4] = bytes([key % 256, 200, 1, key % 7])
+    conn = await connect(simulator, max_in_flight=4)
+    table = await conn.dump_config(10, 300)
+    # 290 entries in blocks of 63
+    assert simulator.requests == 5
+    assert len(table) == 290
+    assert (table.start, table.end) == (10, 300)
+    assert table[299] == 299 % 256
+    assert table.row(100) == (100, 200, 1, 100 % 7)
+    assert list(table.values[:3]) == [10, 11, 12]
+    assert list(table.column('change_step')[:2]) == [10 % 7, 11 % 7]
+    entry = ConfigEntry(42, table.data, table.offset(42))
+    assert (entry.key, entry.value, entry.max_value) == (42, 42, 200)
+    with pytest.raises(KeyError):
+        table[300]
+
+@pytest.mark.asyncio
+async def test_dump_config_long_reply(start_simulator, connect):
+    simulator = await start_simulator()
+    for key in range(1024):
+        simulator.config[key * 4:key * 4 + 4] = bytes([key % 256, 200, 1, 0])
+    handle_request = simulator.handle_request
+    # Replies carry one entry more than requested
+    simulator.handle_request = lambda packet: handle_request(packet) + b'\xFF' * 4
+    conn = await connect(simulator)
+    table = await conn.dump_config(0, 100, chunk=30)
+    assert len(table) == 100
+    assert list(table.values) == list(range(100))
+    with pytest.raises(IllegalArgumentException):
+        await conn.dump_config(0, 100, chunk=64)
+
+def test_config_diff():
+    old = ConfigTable(0, bytearray(4 * 200))
+    new = ConfigTable.from_dict(old.to_dict())
+    assert old.diff(new) == []
+    new.data[4 * 150] = 9
+    assert old.diff(new) == [(150, (0, 0, 0, 0), (9, 0, 0, 0))]
+    shifted = ConfigTable(198, bytearray(4 * 3))
+    assert old.diff(shifted) == [(key, (0, 0, 0, 0), None) for key in range(0, 198)] + [(200, None, (0, 0, 0, 0))]
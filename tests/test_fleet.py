@@ -0,0 +1,45 @@
+from ..hanazeder.Hanazeder import ConnectionInvalidError
+from ..hanazeder.fleet import HanazederFleet
+
+import asyncio
+import pytest
+import socket
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.mark.asyncio
+async def test_fleet_isolates_devices(start_simulator):
+    fast = await start_simulator()
+    slow = await start_simulator(latency=0.5)
+    samples = {}
+    fleet = HanazederFleet(request_timeout=2, metrics=True,
+        on_sample=lambda device, signal, value, timestamp: samples.setdefault(device.name, []).append(value))
+    for (name, simulator) in (('fast', fast), ('slow', slow)):
+        fleet.add(name, address=simulator.host, port=simulator.port)
+    fleet.add('dead', address='127.0.0.1', port=closed_port())
+    with pytest.raises(ValueError):
+        fleet.add('fast', address='127.0.0.1', port=1)
+    with pytest.raises(ConnectionInvalidError):
+        fleet.add('nothing')
+    try:
+        opened = await fleet.open()
+        assert sorted(device.name for device in opened) == ['fast', 'slow']
+        fleet.add_sensor(1, 0.01)
+        fleet.start()
+        await asyncio.sleep(0.2)
+        # The slow device does not hold up the fast one
+        assert len(samples['fast']) > 10
+        assert 'slow' not in samples
+        assert set(samples['fast']) == {20.7}
+        health = fleet.health()
+        assert (health['total'], health['open'], health['failed']) == (3, 2, 1)
+        assert health['devices']['fast']['healthy']
+        assert not health['devices']['dead']['healthy']
+        assert health['devices']['fast']['metrics']['responses'] >= 10
+        # Connections do not share message numbers or requests
+        assert fleet.devices['fast'].conn.in_flight is not fleet.devices['slow'].conn.in_flight
+    finally:
+        await fleet.close()
@@ -0,0 +1,63 @@
+from ..hanazeder.Hanazeder import DeviceType
+from ..hanazeder.gateway import HanazederGateway
+
+import asyncio
+import pytest
+import pytest_asyncio
+
+@pytest_asyncio.fixture
+async def start_gateway(start_simulator, connect):
+    """Start a gateway in front of a simulator, closed after the test."""
+    gateways = []
+    async def start(simulator, **options) -> HanazederGateway:
+        gateway = HanazederGateway(await connect(simulator), **options)
+        gateways.append(gateway)
+        await gateway.start()
+        return gateway
+    yield start
+    for gateway in gateways:
+        await gateway.close()
+
+@pytest.mark.asyncio
+async def test_gateway_shares_upstream(start_simulator, connect, start_gateway):
+    simulator = await start_simulator(latency=0.02)
+    gateway = await start_gateway(simulator, value_ttl=60)
+    clients = [await connect((gateway.host, gateway.port)) for _ in range(3)]
+    await clients[0].read_information()
+    assert clients[0].device_type == DeviceType.FP10
+    # Same message numbers on every client, rewritten upstream
+    values = await asyncio.gather(*[client.read_sensors(range(4)) for client in clients])
+    assert values == [[20.0, 20.7, 21.4, 22.1]] * 3
+    assert await clients[1].read_sensor(2) == 21.4
+    assert simulator.requests == 5
+    stats = gateway.stats()
+    assert stats['requests'] == 14
+    assert stats['upstream'] == 5
+    assert stats['coalesced'] == 8
+    assert stats['cache_hits'] == 1
+
+@pytest.mark.asyncio
+async def test_gateway_values_expire(start_simulator, connect, start_gateway):
+    simulator = await start_simulator(latency=0.001)
+    gateway = await start_gateway(simulator, value_ttl=0.05)
+    client = await connect((gateway.host, gateway.port))
+    assert await client.read_sensor(1) == 20.7
+    simulator.sensors[1] = 300
+    assert await client.read_sensor(1) == 20.7
+    await asyncio.sleep(0.1)
+    assert await client.read_sensor(1) == 30.0
+    assert gateway.stats()['upstream'] == 2
+
+@pytest.mark.asyncio
+async def test_gateway_forwards_other_commands(start_simulator, connect, start_gateway):
+    simulator = await start_simulator(latency=0.02)
+    handle_request = simulator.handle_request
+    # Answer a command the gateway does not know as a read
+    simulator.handle_request = lambda packet: b'\x01' if packet.msg_type == 0x42 else handle_request(packet)
+    gateway = await start_gateway(simulator)
+    clients = [await connect((gateway.host, gateway.port)) for _ in range(2)]
+    replies = await asyncio.gather(*[client.send_request(b'\x42\x01\x07') for client in clients])
+    assert [reply.msg for reply in replies] == [b'\x01', b'\x01']
+    assert simulator.requests == 2
+    assert await clients[0].send_request(b'\x42\x01\x07')
+    assert gateway.stats()['upstream'] == 3
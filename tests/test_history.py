@@ -0,0 +1,67 @@
+from ..hanazeder.comm import SENSOR_GONE_RAW
+from ..hanazeder.history import HistoryStore, Ring, TimeSeries
+from ..hanazeder.poller import PollSignal
+
+import math
+import pytest
+
+def test_ring_wraps():
+    ring = Ring(4, ('d', 'h'))
+    for timestamp in range(6):
+        ring.append(timestamp, timestamp * 10)
+    assert len(ring) == 4
+    (timestamps, values) = ring.range()
+    assert list(timestamps) == [2, 3, 4, 5]
+    assert values.typecode == 'h'
+    assert list(values) == [20, 30, 40, 50]
+    assert list(ring.range(3, 5)[1]) == [30, 40]
+    assert list(ring.range(10)[0]) == []
+    with pytest.raises(ValueError):
+        ring.append(4, 0)
+
+def test_clock_stepped_back():
+    series = TimeSeries(10, tiers=[(10, 5)])
+    series.append(100, 1)
+    series.append(125, 2)
+    # Wall clock stepped back by a minute
+    series.append(65, 3)
+    series.append(126, 4)
+    assert list(series.range()[0]) == [100, 125, 125, 126]
+    assert list(series.range()[1]) == [1, 2, 3, 4]
+    assert series.clamped == 1
+
+def test_tiers():
+    series = TimeSeries(100, tiers=[(10, 5)])
+    for timestamp in range(25):
+        raw = SENSOR_GONE_RAW if timestamp in (3, 4) else 200 + timestamp
+        series.append(timestamp, raw)
+    tier = series.tier(10)
+    (buckets, mins, maxs, means, counts) = tier.range()
+    # The bucket starting at 20 is still open
+    assert list(buckets) == [0, 10]
+    assert list(mins) == [200, 210]
+    assert list(maxs) == [209, 219]
+    assert list(counts) == [8, 10]
+    assert means[1] == 214.5
+    assert list(series.range(5, 8)[1]) == [205, 206, 207]
+
+def test_tier_without_values():
+    series = TimeSeries(10, tiers=[(10, 5)])
+    series.append(0, SENSOR_GONE_RAW)
+    series.append(10, 100)
+    (buckets, mins, maxs, means, counts) = series.tier(10).range()
+    assert (mins[0], counts[0]) == (SENSOR_GONE_RAW, 0)
+    assert math.isnan(means[0])
+
+def test_history_store():
+    store = HistoryStore(capacity=10, tiers=[(60, 10)])
+    store.on_sample(PollSignal('sensor_1', None, 1), 20.7, 1.0)
+    store.record('sensor_1', None, 2.0)
+    store.record('energy', (6553.0, -1.5, None), 1.0)
+    store.record('outlets', (True, False) + (False,) * 8, 1.0)
+    assert list(store.series['sensor_1'].range()[1]) == [207, SENSOR_GONE_RAW]
+    assert list(store.series['energy_total'].range()[1]) == [65530]
+    assert list(store.series['energy_current'].range()[1]) == [-15]
+    assert list(store.series['energy_impulse'].range()[1]) == [SENSOR_GONE_RAW]
+    assert list(store.series['outlet_0'].range()[1]) == [1]
+    assert store.series['outlet_0'].ring.columns[1].itemsize == 1
@@ -1,7 +1,10 @@
-from ..hanazeder.Hanazeder import HanazederFP
+from ..hanazeder.Hanazeder import HanazederFP, InvalidReplyError, RequestTimeoutError, ShutdownError
+from ..hanazeder.cache import TTLCache
+from ..hanazeder.comm import HanazederFrameDecoder, hanazeder_encode_msg
 from ..hanazeder.encoding import hex_to_byte
 
 from unittest.mock import MagicMock
+import asyncio
 import pytest
 
 @pytest.mark.asyncio
@@ -24,4 +27,225 @@ async def test_create_instance(mocker):
 #     inst = HanazederFP()
 #     inst.connected = True
 #     msg = inst.read_register(1)
-#     assert msg == mocked_read_content
\ No newline at end of file
+#     assert msg == mocked_read_content
+
+def reply(msg_no: int, payload: bytes) -> bytes:
+    return hanazeder_encode_msg(b'\xEE', msg_no, b'\xF0' + len(payload).to_bytes(1, 'little') + payload)
+
+async def settle():
+    # Let scheduled tasks run until they block
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def sent_frames(inst: HanazederFP):
+    """Requests written to the mocked connection."""
+    decoder = HanazederFrameDecoder(b'\xEE', escaped_checksum=False)
+    return decoder.feed(b''.join(call.args[0] for call in inst.connection.write.call_args_list))
+
+def inst_packet(msg_no: int, payload: bytes):
+    return HanazederFrameDecoder(b'\xEE').feed(reply(msg_no, payload))[0]
+
+@pytest.mark.asyncio
+async def test_msg_no_skips_in_flight():
+    inst = HanazederFP()
+    inst.last_msg_num = 237
+    assert await inst.get_next_msg_no() == 237
+    # Escape byte is skipped
+    assert await inst.get_next_msg_no() == 239
+    inst.last_msg_num = 237
+    # Still reserved numbers are skipped
+    assert await inst.get_next_msg_no() == 240
+
+@pytest.mark.asyncio
+async def test_msg_no_backpressure():
+    inst = HanazederFP()
+    for _ in range(HanazederFP.MSG_NO_COUNT):
+        await inst.get_next_msg_no()
+    assert 238 not in inst.in_flight
+    waiter = asyncio.ensure_future(inst.get_next_msg_no())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    msg = hanazeder_encode_msg(b'\xEE', 5, b'\x04\x01\x00')
+    inst.connection = MagicMock()
+    req = await inst.send_msg(msg, inst.parse_sensor_packet)
+    inst.handle_packet(inst_packet(5, b'\x55\x01'))
+    assert await inst.handle_req_response(req) == 34.1
+    assert await waiter == 5
+
+@pytest.mark.asyncio
+async def test_response_matching():
+    inst = HanazederFP()
+    inst.connection = MagicMock()
+    first = await inst.send_msg(await inst.create_read_sensor_msg(0), inst.parse_sensor_packet)
+    second = await inst.send_msg(await inst.create_read_sensor_msg(1), inst.parse_sensor_packet)
+    inst.read_bytes(reply(second.msg_no, b'\x55\x01') + reply(first.msg_no, b'\xFF\x7F'))
+    assert await inst.handle_req_response(second) == 34.1
+    assert await inst.handle_req_response(first) is None
+    assert inst.in_flight == {}
+    # Unknown replies are dropped
+    inst.read_bytes(reply(first.msg_no, b'\x55\x01'))
+
+@pytest.mark.asyncio
+async def test_shutdown_fails_requests():
+    inst = HanazederFP()
+    inst.connection = MagicMock()
+    req = await inst.send_msg(await inst.create_read_sensor_msg(0), inst.parse_sensor_packet)
+    inst.shutdown()
+    with pytest.raises(ShutdownError):
+        await inst.handle_req_response(req)
+    assert inst.in_flight == {}
+
+@pytest.mark.asyncio
+async def test_window_limits_in_flight():
+    inst = HanazederFP(max_in_flight=2)
+    inst.connection = MagicMock()
+    tasks = [asyncio.ensure_future(inst.read_sensor(idx)) for idx in range(4)]
+    await settle()
+    assert len(sent_frames(inst)) == 2
+    inst.read_bytes(reply(0, b'\x55\x01'))
+    await settle()
+    assert len(sent_frames(inst)) == 3
+    # Paused transport holds back further writes
+    inst.writable.clear()
+    inst.read_bytes(reply(1, b'\x55\x01'))
+    await settle()
+    assert len(sent_frames(inst)) == 3
+    inst.writable.set()
+    await settle()
+    assert len(sent_frames(inst)) == 4
+    inst.read_bytes(reply(2, b'\x55\x01') + reply(3, b'\x55\x01'))
+    assert await asyncio.gather(*tasks) == [34.1] * 4
+
+@pytest.mark.asyncio
+async def test_single_flight():
+    inst = HanazederFP()
+    inst.connection = MagicMock()
+    first = asyncio.ensure_future(inst.read_sensor(3))
+    second = asyncio.ensure_future(inst.read_sensor(3))
+    other = asyncio.ensure_future(inst.read_sensor(4))
+    await settle()
+    assert len(sent_frames(inst)) == 2
+    inst.read_bytes(reply(0, b'\x55\x01') + reply(1, b'\xFF\x7F'))
+    assert await first == 34.1
+    assert await second == 34.1
+    assert await other is None
+    assert inst.pending_reads == {}
+
+@pytest.mark.asyncio
+async def test_read_sensors():
+    inst = HanazederFP(max_in_flight=8)
+    inst.connection = MagicMock()
+    batch = asyncio.ensure_future(inst.read_sensors([2, 0, 1]))
+    await settle()
+    assert len(sent_frames(inst)) == 3
+    sent = [packet.msg[0] for packet in sent_frames(inst)]
+    assert sent == [2, 0, 1]
+    inst.read_bytes(reply(2, b'\x03\x00') + reply(0, b'\x01\x00') + reply(1, b'\x02\x00'))
+    assert await batch == [0.1, 0.2, 0.3]
+
+@pytest.mark.asyncio
+async def test_cached_sensor_name():
+    inst = HanazederFP(cache=TTLCache())
+    inst.connection = MagicMock()
+    name = asyncio.ensure_future(inst.read_sensor_name(1))
+    await settle()
+    inst.read_bytes(reply(0, b'\x01Boiler    '))
+    assert await name == 'Boiler'
+    assert await inst.read_sensor_name(1) == 'Boiler'
+    assert len(sent_frames(inst)) == 1
+    assert inst.cache.hits == 1
+    # Live values are never cached
+    value = asyncio.ensure_future(inst.read_sensor(1))
+    await settle()
+    assert len(sent_frames(inst)) == 2
+    inst.read_bytes(reply(1, b'\x55\x01'))
+    assert await value == 34.1
+
+@pytest.mark.asyncio
+async def test_retry_with_fresh_msg_no():
+    inst = HanazederFP(request_timeout=0.02, max_retries=3)
+    inst.connection = MagicMock()
+    value = asyncio.ensure_future(inst.read_sensor(1))
+    await asyncio.sleep(0.03)
+    assert len(sent_frames(inst)) == 2
+    (first, second) = sent_frames(inst)
+    assert first.msg_no != second.msg_no
+    assert first.msg == second.msg
+    # Late reply to the first attempt is not taken
+    inst.read_bytes(reply(first.msg_no, b'\x00\x00'))
+    assert not value.done()
+    inst.read_bytes(reply(second.msg_no, b'\x55\x01'))
+    assert await value == 34.1
+    assert inst.in_flight == {}
+
+@pytest.mark.asyncio
+async def test_burst_holds_window_of_msg_nos():
+    inst = HanazederFP(request_timeout=0.02, max_in_flight=1)
+    inst.connection = MagicMock()
+    burst = [asyncio.ensure_future(inst.read_debug_block(start, 1, lambda packet: packet.msg))
+        for start in range(300)]
+    await settle()
+    # Requests waiting for the window hold no message number
+    assert len(inst.in_flight) == 1
+    await asyncio.sleep(0.03)
+    (first, second) = sent_frames(inst)
+    assert first.msg == second.msg
+    assert first.msg_no != second.msg_no
+    for task in burst:
+        task.cancel()
+
+@pytest.mark.asyncio
+async def test_transmit_replaces_timer():
+    inst = HanazederFP(request_timeout=0.05, max_retries=0)
+    inst.connection = MagicMock()
+    value = asyncio.ensure_future(inst.read_sensor(1))
+    await settle()
+    (request,) = inst.in_flight.values()
+    await asyncio.sleep(0.03)
+    # Sent again like a replay, only the new deadline counts
+    inst.transmit(request)
+    await asyncio.sleep(0.035)
+    assert not value.done()
+    with pytest.raises(RequestTimeoutError):
+        await value
+
+@pytest.mark.asyncio
+async def test_read_after_last_waiter_cancelled():
+    inst = HanazederFP()
+    inst.connection = MagicMock()
+    first = asyncio.ensure_future(inst.read_sensor(1))
+    await settle()
+    # The second caller arrives right after the first one gave up
+    first.cancel()
+    second = asyncio.ensure_future(inst.read_sensor(1))
+    await settle()
+    assert first.cancelled()
+    inst.read_bytes(reply(sent_frames(inst)[-1].msg_no, b'\x55\x01'))
+    assert await second == 34.1
+
+@pytest.mark.asyncio
+async def test_retries_exhausted():
+    inst = HanazederFP(request_timeout=0.005, max_retries=2)
+    inst.connection = MagicMock()
+    with pytest.raises(RequestTimeoutError):
+        await inst.read_sensor(1)
+    assert len(sent_frames(inst)) == 3
+    assert inst.connection.write.call_count == 3
+    assert inst.in_flight == {}
+
+@pytest.mark.asyncio
+async def test_writes_coalesced():
+    inst = HanazederFP(max_in_flight=16)
+    inst.connection = MagicMock()
+    batch = asyncio.ensure_future(inst.read_sensors(range(15)))
+    await settle()
+    assert inst.connection.write.call_count == 1
+    assert len(sent_frames(inst)) == 15
+    inst.read_bytes(b''.join(reply(msg_no, b'\x01\x00') for msg_no in range(15)))
+    assert await batch == [0.1] * 15
+
+def test_parse_energy_packet():
+    inst = HanazederFP.__new__(HanazederFP)
+    assert inst.parse_energy_packet(inst_packet(0, hex_to_byte('3A11 FEFF FF7F 0000'))) == (441.0, -0.2, None)
+    with pytest.raises(InvalidReplyError):
+        inst.parse_energy_packet(inst_packet(0, hex_to_byte('3A11 FEFF')))
@@ -0,0 +1,49 @@
+from ..hanazeder.Hanazeder import HanazederFP
+from ..hanazeder.metrics import HanazederMetrics, Histogram
+from .test_main import reply
+
+from unittest.mock import MagicMock
+import asyncio
+import pytest
+
+def test_histogram_percentiles():
+    histogram = Histogram((0.01, 0.1, 1.0))
+    for value in [0.005] * 90 + [0.05] * 9 + [5.0]:
+        histogram.record(value)
+    # Interpolated inside the bucket
+    assert histogram.percentile(50) == pytest.approx(0.01 * 50 / 90)
+    assert histogram.percentile(95) == pytest.approx(0.01 + 0.09 * 5 / 9)
+    # Overflow bucket reports the maximum seen
+    assert histogram.percentile(100) == 5.0
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 100
+    assert snapshot['buckets'] == {0.01: 90, 0.1: 9, 1.0: 0, float('inf'): 1}
+    assert Histogram().percentile(50) is None
+
+@pytest.mark.asyncio
+async def test_metrics_disabled():
+    inst = HanazederFP()
+    assert inst.metrics is None
+    assert inst.metrics_snapshot() is None
+
+@pytest.mark.asyncio
+async def test_metrics_recorded():
+    inst = HanazederFP(request_timeout=0.02, metrics=HanazederMetrics())
+    inst.connection = MagicMock()
+    value = asyncio.ensure_future(inst.read_sensor(1))
+    await asyncio.sleep(0.03)
+    # Unmatched reply, then a corrupted one, then the retry's answer
+    inst.read_bytes(reply(100, b'\x00\x00'))
+    inst.read_bytes(reply(1, b'\x55\x01')[:-1] + b'\x00')
+    inst.read_bytes(reply(1, b'\x55\x01'))
+    assert await value == 34.1
+    snapshot = inst.metrics_snapshot()
+    assert snapshot['requests'] == 1
+    assert snapshot['retransmits'] == 1
+    assert snapshot['responses'] == 1
+    assert snapshot['unmatched'] == 1
+    assert snapshot['checksum_errors'] == 1
+    assert snapshot['writes'] == 2
+    assert snapshot['bytes_sent'] == sum(len(call.args[0]) for call in inst.connection.write.call_args_list)
+    assert snapshot['bytes_received'] == 3 * len(reply(1, b'\x55\x01'))
+    assert snapshot['latency'][0x04]['count'] == 1
@@ -0,0 +1,58 @@
+from ..hanazeder.poller import HanazederPoller, PollSignal
+
+import asyncio
+import pytest
+
+def counting_read(delay=0):
+    calls = []
+    async def read():
+        calls.append(asyncio.get_running_loop().time())
+        await asyncio.sleep(delay)
+        return len(calls)
+    return (read, calls)
+
+@pytest.mark.asyncio
+async def test_poll_intervals():
+    poller = HanazederPoller(None, max_concurrent=4)
+    (fast, fast_calls) = counting_read()
+    (slow, slow_calls) = counting_read()
+    samples = []
+    poller.on_sample = lambda signal, value, timestamp: samples.append(signal.name)
+    poller.add(PollSignal('fast', fast, 0.01))
+    poller.add(PollSignal('slow', slow, 0.05))
+    poller.start()
+    await asyncio.sleep(0.22)
+    await poller.stop()
+    assert 15 <= len(fast_calls) <= 24
+    assert 4 <= len(slow_calls) <= 6
+    assert samples.count('fast') == len(fast_calls)
+    stats = poller.stats()
+    assert stats['fast']['requested_rate'] == 100
+    assert stats['fast']['skipped'] == 0
+
+@pytest.mark.asyncio
+async def test_poll_overload():
+    # Reads take longer than the interval, only one at a time
+    poller = HanazederPoller(None, max_concurrent=1)
+    (urgent, urgent_calls) = counting_read(0.02)
+    (background, background_calls) = counting_read(0.02)
+    poller.add(PollSignal('background', background, 0.01, priority=1))
+    poller.add(PollSignal('urgent', urgent, 0.01, priority=0))
+    poller.start()
+    await asyncio.sleep(0.2)
+    await poller.stop()
+    stats = poller.stats()
+    assert stats['urgent']['skipped'] > 0
+    assert len(urgent_calls) > len(background_calls)
+    assert stats['urgent']['achieved_rate'] < stats['urgent']['requested_rate']
+
+@pytest.mark.asyncio
+async def test_poll_errors():
+    poller = HanazederPoller(None, max_concurrent=1)
+    async def failing():
+        raise ValueError('no reply')
+    poller.add(PollSignal('failing', failing, 0.01))
+    poller.start()
+    await asyncio.sleep(0.05)
+    await poller.stop()
+    assert poller.stats()['failing']['errors'] >= 3
@@ -0,0 +1,44 @@
+from ..hanazeder.Hanazeder import DeviceType
+from ..hanazeder.profile import DeviceProfileStore, load_profile
+
+import pytest
+
+@pytest.mark.asyncio
+async def test_profile_warm_start(tmp_path, start_simulator, connect):
+    store = DeviceProfileStore(str(tmp_path / 'profiles.json'))
+    simulator = await start_simulator()
+    # Sensor 0 is labelled "Kollektor", the others have custom names
+    simulator.config[27 * 4] = 1
+    conn = await connect(simulator)
+    profile = await load_profile(conn, store)
+    assert profile.device_type == DeviceType.FP10
+    assert profile.version == '1.6'
+    assert profile.sensor_names[0] == 'Kollektor'
+    assert profile.sensor_names[1] == 'Sensor 1'
+    # Nothing to verify after a discovery
+    assert conn.profile_check is None
+    discovery_requests = simulator.requests
+
+    conn = await connect(simulator)
+    profile = await load_profile(conn, store)
+    assert profile.sensor_names[1] == 'Sensor 1'
+    assert conn.version == '1.6'
+    # Data reads start before anything else was sent
+    assert simulator.requests == discovery_requests
+    assert await conn.profile_check is profile
+    assert simulator.requests == discovery_requests + 1
+
+@pytest.mark.asyncio
+async def test_profile_device_changed(tmp_path, start_simulator, connect):
+    store = DeviceProfileStore(str(tmp_path / 'profiles.json'))
+    simulator = await start_simulator()
+    await load_profile(await connect(simulator), store)
+
+    simulator.information = b'\x01\x01\x02\x01\x07'
+    simulator.sensor_names[2] = 'Renamed'
+    conn = await connect(simulator)
+    profile = await load_profile(conn, store)
+    profile = await conn.profile_check
+    assert profile.device_type == DeviceType.FP6
+    assert profile.sensor_names[2] == 'Renamed'
+    assert [entry.version for entry in store.read_all().values()] == ['1.7']
@@ -0,0 +1,41 @@
+from ..hanazeder.read import CliReader
+
+import json
+import pytest
+
+@pytest.mark.asyncio
+async def test_cli_json_lines(monkeypatch, capsys, start_simulator):
+    simulator = await start_simulator()
+    monkeypatch.setattr('sys.argv', ['hanazeder_read', '--address', simulator.host, '--port', str(simulator.port),
+        '--sensors', '--outlets', '--json', '--count', '3', '--rate', '0'])
+    assert await CliReader().main() == 0
+    captured = capsys.readouterr()
+    lines = [json.loads(line) for line in captured.out.splitlines()]
+    assert lines[0]['device_type'] == 'FP10'
+    assert lines[0]['sensor_names']['sensor_1'] == 'Sensor 1'
+    assert [line['sequence'] for line in lines[1:]] == [0, 1, 2]
+    assert lines[1]['values']['sensor_1'] == 20.7
+    assert lines[1]['values']['outlets'] == [False] * 10
+    summary = json.loads(captured.err)['summary']
+    assert summary['rounds'] == 3
+    assert summary['retries'] == 0
+    assert summary['crc_errors'] == 0
+    assert summary['latency_p50'] is not None
+
+@pytest.mark.asyncio
+async def test_cli_profile_device_changed(tmp_path, monkeypatch, capsys, start_simulator):
+    simulator = await start_simulator()
+    argv = ['hanazeder_read', '--address', simulator.host, '--port', str(simulator.port),
+        '--sensor', '3', '--profile', str(tmp_path / 'profiles.json')]
+    monkeypatch.setattr('sys.argv', argv)
+    assert await CliReader().main() == 0
+    assert 'Sensor Sensor 2 (2)' in capsys.readouterr().out
+
+    simulator.information = b'\x00\x00\x02\x01\x07'
+    simulator.sensor_names[2] = 'Renamed'
+    monkeypatch.setattr('sys.argv', argv + ['--count', '3', '--rate', '20'])
+    assert await CliReader().main() == 0
+    lines = capsys.readouterr().out.splitlines()
+    # The stored profile is used first, then the one discovered again
+    assert lines[1] == 'Sensor Sensor 2 (2) has value 21.4'
+    assert lines[-1] == 'Sensor Renamed (2) has value 21.4'
@@ -0,0 +1,62 @@
+from ..hanazeder.Hanazeder import NotConnectedError
+from ..hanazeder.backoff import Backoff
+from ..hanazeder.cache import TTLCache
+from ..hanazeder.metrics import HanazederMetrics
+
+import asyncio
+import pytest
+
+def test_backoff():
+    backoff = Backoff(initial=1, maximum=5, jitter=0.5, random=lambda: 1.0)
+    assert [backoff.next() for _ in range(5)] == [0.5, 1, 2, 2.5, 2.5]
+    backoff.reset()
+    assert backoff.next() == 0.5
+
+@pytest.mark.asyncio
+async def test_reconnect_replays_requests(start_simulator, connect):
+    simulator = await start_simulator(latency=0.05)
+    conn = await connect(simulator, cache=TTLCache(), metrics=HanazederMetrics(),
+        reconnect=Backoff(initial=0.02, jitter=0), max_pending=2)
+    await conn.read_information()
+    await conn.read_sensor_name(1)
+    # Drop the connection while a request is in flight
+    in_flight = asyncio.ensure_future(conn.read_sensor(1))
+    await asyncio.sleep(0.01)
+    await simulator.close()
+    simulator.disconnect()
+    await asyncio.sleep(0.01)
+    assert not conn.connected
+    waiting = [asyncio.ensure_future(conn.read_sensor(idx)) for idx in (2, 3)]
+    await asyncio.sleep(0)
+    # Only max_pending requests are kept during the outage
+    with pytest.raises(NotConnectedError):
+        await conn.read_sensor(4)
+    await simulator.start(simulator.host, simulator.port)
+    assert await in_flight == 20.7
+    assert await asyncio.gather(*waiting) == [21.4, 22.1]
+    await conn.identity_check
+    snapshot = conn.metrics_snapshot()
+    assert (snapshot['disconnects'], snapshot['reconnects']) == (1, 1)
+    assert snapshot['recovery']['count'] == 1
+    # Same device, cached metadata is kept
+    assert len(conn.cache.entries) == 2
+
+@pytest.mark.asyncio
+async def test_no_reconnect_fails_requests(start_simulator, connect):
+    simulator = await start_simulator(latency=0.05)
+    conn = await connect(simulator)
+    value = asyncio.ensure_future(conn.read_sensor(1))
+    await asyncio.sleep(0.01)
+    simulator.disconnect()
+    with pytest.raises(NotConnectedError):
+        await value
+
+@pytest.mark.asyncio
+async def test_reconnect_while_paused(start_simulator, connect):
+    simulator = await start_simulator(latency=0.001)
+    conn = await connect(simulator, reconnect=Backoff(initial=0.02, jitter=0))
+    conn.connection.get_protocol().pause_writing()
+    simulator.disconnect()
+    await asyncio.sleep(0.01)
+    assert not conn.connected
+    assert await asyncio.wait_for(conn.read_sensor(2), 1) == 21.4
@@ -0,0 +1,25 @@
+from ..hanazeder.rtt import RttEstimator
+
+import pytest
+
+def test_initial_rto():
+    rtt = RttEstimator(initial_rto=2)
+    assert rtt.rto(4) == 2
+    assert rtt.rto(4, retries=2) == 8
+
+def test_rto_follows_samples():
+    rtt = RttEstimator(initial_rto=2, min_rto=0.01)
+    rtt.update(4, 0.1)
+    # srtt + 4 * rttvar with rttvar = rtt / 2 after the first sample
+    assert rtt.rto(4) == pytest.approx(0.3)
+    for _ in range(50):
+        rtt.update(4, 0.1)
+    assert rtt.rto(4) == pytest.approx(0.1, abs=0.01)
+    # Other request types keep the initial timeout
+    assert rtt.rto(7) == 2
+
+def test_rto_bounds():
+    rtt = RttEstimator(initial_rto=2, min_rto=0.05, max_rto=5)
+    rtt.update(4, 0.0001)
+    assert rtt.rto(4) == 0.05
+    assert rtt.rto(4, retries=10) == 5
@@ -0,0 +1,67 @@
+import asyncio
+import serial
+import time
+import pytest
+
+async def max_loop_lag(stop: asyncio.Event, interval=0.001) -> float:
+    lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(lag, time.perf_counter() - start - interval)
+    return lag
+
+@pytest.mark.asyncio
+async def test_serial_sweep_does_not_block_loop(monkeypatch, start_simulator, connect):
+    drains = []
+    def slow_flush(port):
+        # tcdrain of a request at 38400 baud
+        drains.append(port)
+        time.sleep(0.02)
+    monkeypatch.setattr(serial.Serial, 'flush', slow_flush)
+    conn = await connect(await start_simulator(pty=True, latency=0.001))
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(max_loop_lag(stop))
+    for _ in range(5):
+        assert len(await conn.read_sensors(range(15))) == 15
+    stop.set()
+    assert drains == []
+    assert await lag < 0.015
+    # Waiting for the line runs in an executor
+    await conn.drain()
+    assert len(drains) == 1
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_transport(start_simulator, connect):
+    simulator = await start_simulator(latency=0.001)
+    conn = await connect(simulator)
+    for protocol in simulator.connections:
+        protocol.transport.pause_reading()
+    # More than the socket buffers hold, the simulator skips it
+    conn.connection.write(bytes(32 * 1024 * 1024))
+    drain = asyncio.ensure_future(conn.drain())
+    await asyncio.sleep(0.05)
+    assert not drain.done()
+    for protocol in simulator.connections:
+        protocol.transport.resume_reading()
+    await asyncio.wait_for(drain, 5)
+    assert conn.connection.get_write_buffer_size() == 0
+    assert conn.connection.get_write_buffer_limits() == (16 * 1024, 64 * 1024)
+    assert await conn.read_sensor(1) == 20.7
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_serial_port(start_simulator, connect):
+    simulator = await start_simulator(pty=True)
+    conn = await connect(simulator)
+    loop = asyncio.get_running_loop()
+    # Stop reading the line, the simulator skips the zeros later
+    loop.remove_reader(simulator.pty.master)
+    conn.connection.write(bytes(200 * 1024))
+    assert conn.connection.get_write_buffer_size() > 0
+    drain = asyncio.ensure_future(conn.drain())
+    await asyncio.sleep(0.05)
+    assert not drain.done()
+    loop.add_reader(simulator.pty.master, simulator.pty.read_ready)
+    await asyncio.wait_for(drain, 5)
+    assert conn.connection.get_write_buffer_size() == 0
+    assert await conn.read_sensor(1) == 20.7
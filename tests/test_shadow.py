@@ -0,0 +1,32 @@
+from ..hanazeder.shadow import DebugShadow
+
+import pytest
+
+def test_shadow_plan():
+    shadow = DebugShadow(None, max_block=100, max_gap=10)
+    for (start, count) in [(50, 4), (0, 10), (15, 5), (60, 60), (200, 2)]:
+        shadow.register(start, count)
+    assert [(block.start, block.count) for block in shadow.blocks] == [(0, 20), (50, 70), (200, 2)]
+    assert shadow.block(16, 2).start == 0
+    with pytest.raises(KeyError):
+        shadow.read(100, 30)
+    with pytest.raises(ValueError):
+        shadow.register(0, 101)
+
+@pytest.mark.asyncio
+async def test_energy_and_outlets_one_request(start_simulator, connect):
+    simulator = await start_simulator()
+    simulator.debug_memory[313:319] = bytes([0xB9, 0x01, 0x05, 0x00, 0xFF, 0x7F])
+    simulator.debug_memory[211:214] = b'\x01\x00\x01'
+    conn = await connect(simulator)
+    (energy, outlets) = await conn.read_energy_and_outlets()
+    assert simulator.requests == 1
+    assert energy == (44.1, 0.5, None)
+    assert outlets[:4] == (True, False, True, False)
+    view = conn.shadow.read(211, 3)
+    simulator.debug_memory[212] = 1
+    await conn.shadow.refresh()
+    # Views follow the refreshed data
+    assert bytes(view) == b'\x01\x01\x01'
+    assert conn.shadow.updated(211, 3) is not None
+    assert simulator.requests == 2
@@ -0,0 +1,24 @@
+import pytest
+
+@pytest.mark.asyncio
+async def test_simulator_pty(start_simulator, connect):
+    simulator = await start_simulator(pty=True)
+    conn = await connect(simulator)
+    assert conn.target == f'serial:{simulator.path}'
+    assert await conn.read_sensors(range(3)) == [20.0, 20.7, 21.4]
+    assert await conn.read_sensor_name(2) == 'Sensor 2'
+
+@pytest.mark.asyncio
+async def test_simulator_escaped_payloads(start_simulator, connect):
+    conn = await connect(await start_simulator(escaped_payloads=True))
+    assert await conn.read_sensor(0) == 49.4
+    assert await conn.read_debug_block(0, 4, lambda packet: packet.msg) == b'\xEE' * 4
+
+@pytest.mark.asyncio
+async def test_simulator_lossy_line(start_simulator, connect):
+    simulator = await start_simulator(drop_rate=0.2, corrupt_rate=0.2, seed=3)
+    conn = await connect(simulator, request_timeout=0.02, max_retries=10)
+    for _ in range(3):
+        assert await conn.read_sensors(range(15)) == [(200 + 7 * idx) / 10 for idx in range(15)]
+    assert simulator.lost > 0
+    assert simulator.corrupted > 0
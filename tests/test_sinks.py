@@ -0,0 +1,51 @@
+from ..hanazeder.sinks import CsvSink, LineProtocolSink, SQLiteSink
+from ..hanazeder.poller import PollSignal
+
+import csv
+import sqlite3
+
+def test_sqlite_sink(tmp_path):
+    path = str(tmp_path / 'readings.db')
+    sink = SQLiteSink(path, batch_size=2, flush_interval=60)
+    sink.on_sample(PollSignal('sensor_1', None, 1), 20.7, 1.0)
+    sink.add('energy', (100.0, None, 0.5), 2.0, device='cellar')
+    sink.close()
+    assert sink.stats() == {'queued': 4, 'written': 4, 'pending': 0, 'dropped': 0, 'batches': 2, 'errors': 0}
+    db = sqlite3.connect(path)
+    assert db.execute('SELECT * FROM readings ORDER BY rowid').fetchall() == [
+        (1.0, '', 'sensor_1', 20.7),
+        (2.0, 'cellar', 'energy_total', 100.0),
+        (2.0, 'cellar', 'energy_current', None),
+        (2.0, 'cellar', 'energy_impulse', 0.5),
+    ]
+    db.close()
+
+def test_csv_sink_rotates(tmp_path):
+    path = str(tmp_path / 'readings.csv')
+    sink = CsvSink(path, max_bytes=200, backup_count=2, batch_size=5)
+    for timestamp in range(30):
+        sink.add('sensor_0', 20.0 + timestamp, float(timestamp))
+    sink.close()
+    assert sink.written == 30
+    files = [path + '.2', path + '.1', path]
+    rows = []
+    for name in files:
+        with open(name, newline='') as file:
+            content = list(csv.reader(file))
+        assert content[0] == ['timestamp', 'device', 'signal', 'value']
+        rows.extend(content[1:])
+    # Older files beyond backup_count are gone
+    assert rows[-1] == ['29.0', '', 'sensor_0', '49.0']
+    assert len(rows) < 30
+
+def test_line_protocol_sink(tmp_path):
+    path = str(tmp_path / 'readings.lp')
+    sink = LineProtocolSink(path, flush_interval=0.01, max_queue=3)
+    sink.add('outlets', (True, False, None), 1.5, device='garage 1')
+    sink.add('sensor_0', 1.0, 2.0)
+    sink.close()
+    assert sink.dropped == 1
+    with open(path) as file:
+        assert file.read() == (
+            'hanazeder,device=garage\\ 1,signal=outlet_0 value=1.0 1500000000\n'
+            'hanazeder,device=garage\\ 1,signal=outlet_1 value=0.0 1500000000\n')
@@ -0,0 +1,73 @@
+from ..hanazeder.stream import BLOCK, COALESCE, DROP_OLDEST, SnapshotStream
+
+import asyncio
+import pytest
+
+def counter_signals(count: int):
+    state = {'reads': 0}
+    async def read():
+        state['reads'] += 1
+        return state['reads']
+    return ([(f'signal_{idx}', read) for idx in range(count)], state)
+
+@pytest.mark.asyncio
+async def test_stream_simulator(start_simulator, connect):
+    conn = await connect(await start_simulator())
+    snapshots = [snapshot async for snapshot in conn.stream(sensors=[0, 1], outlets=True, rounds=3)]
+    assert [snapshot.sequence for snapshot in snapshots] == [0, 1, 2]
+    assert snapshots[0].values == {'sensor_0': 20.0, 'sensor_1': 20.7, 'outlets': (False,) * 10}
+    assert snapshots[0].errors == {}
+
+@pytest.mark.asyncio
+async def test_stream_block_pipelines():
+    (signals, state) = counter_signals(1)
+    stream = SnapshotStream(signals, buffer=1, policy=BLOCK)
+    async with stream:
+        first = await stream.__anext__()
+        await asyncio.sleep(0.01)
+        # One round buffered and the next one read, then the reader waits
+        assert state['reads'] == 3
+        assert (await stream.__anext__()).sequence == first.sequence + 1
+    assert stream.dropped == 0
+
+@pytest.mark.asyncio
+async def test_stream_drop_oldest():
+    (signals, state) = counter_signals(1)
+    stream = SnapshotStream(signals, buffer=2, policy=DROP_OLDEST, rounds=10)
+    async with stream:
+        await stream.__anext__()
+        await asyncio.sleep(0.01)
+        rest = [snapshot.sequence async for snapshot in stream]
+    assert rest == [8, 9]
+    assert stream.dropped == 7
+
+@pytest.mark.asyncio
+async def test_stream_coalesce():
+    calls = {'flaky': 0}
+    async def flaky():
+        # Only the first two rounds succeed
+        calls['flaky'] += 1
+        if calls['flaky'] > 2:
+            raise TimeoutError()
+        return 'ok'
+    (signals, state) = counter_signals(1)
+    stream = SnapshotStream(signals + [('flaky', flaky)], buffer=1, policy=COALESCE, rounds=5)
+    async with stream:
+        await stream.__anext__()
+        await asyncio.sleep(0.01)
+        snapshot = await stream.__anext__()
+    assert snapshot.sequence == 4
+    assert snapshot.coalesced == 3
+    assert snapshot.values == {'signal_0': 5, 'flaky': 'ok'}
+    assert stream.coalesced == 3
+    assert snapshot.errors == {}
+
+@pytest.mark.asyncio
+async def test_stream_cancelled_read():
+    async def cancelled():
+        raise asyncio.CancelledError()
+    (signals, _) = counter_signals(1)
+    stream = SnapshotStream(signals + [('cancelled', cancelled)], rounds=1)
+    snapshots = [snapshot async for snapshot in stream]
+    assert snapshots[0].values == {'signal_0': 1, 'cancelled': None}
+    assert isinstance(snapshots[0].errors['cancelled'], asyncio.CancelledError)